@@ -1,5 +1,7 @@
 from statistics import mean
-from llm import chat_completion
+from collections import Counter
+from llm import chat_completion, achat_completion, stream_chat_completion
+from tracing import span
 
 class AnalystAgent:
     SYSTEM_PROMPT = """
@@ -9,7 +11,33 @@ class AnalystAgent:
     - Improvement suggestions
     """
 
-    def analyze(self, summary, ratings):
+    def _user_prompt(self, summary, ratings, corpus_stats=None):
         avg = round(mean(ratings), 2) if ratings else "N/A"
-        user_prompt = f"Summary:\n{summary}\nRatings: {ratings}\nAverage: {avg}"
-        return chat_completion(self.SYSTEM_PROMPT, user_prompt)
+        # Counts, not the list: dup_count expands ratings to one entry per copy
+        counts = dict(sorted(Counter(ratings).items()))
+        prompt = f"Summary:\n{summary}\nRatings ({len(ratings)}): {counts}\nAverage: {avg}"
+        if corpus_stats:
+            # True corpus-level figures, not just the retrieved sample
+            corpus_avg = round(corpus_stats["avg"], 2) if corpus_stats["avg"] else "N/A"
+            prompt += (
+                f"\nAll {corpus_stats['total']} product reviews - "
+                f"rating distribution: {corpus_stats['counts']}, average: {corpus_avg}"
+            )
+        return prompt
+
+    def analyze(self, summary, ratings, corpus_stats=None):
+        with span("analyst"):
+            return chat_completion(self.SYSTEM_PROMPT, self._user_prompt(summary, ratings, corpus_stats))
+
+    async def aanalyze(self, summary, ratings, corpus_stats=None):
+        with span("analyst"):
+            return await achat_completion(
+                self.SYSTEM_PROMPT, self._user_prompt(summary, ratings, corpus_stats)
+            )
+
+    def analyze_stream(self, summary, ratings, corpus_stats=None):
+        """Like analyze, but yields the analysis as text deltas."""
+        with span("analyst", stream=True):
+            yield from stream_chat_completion(
+                self.SYSTEM_PROMPT, self._user_prompt(summary, ratings, corpus_stats)
+            )
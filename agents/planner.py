@@ -1,5 +1,119 @@
+import re
 import json
-from llm import chat_completion
+import time
+from llm import chat_completion, achat_completion
+from product_index import ProductIndex
+from tracing import span
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+# Words that never name a product or an aspect on their own
+_STOP = {
+    "a", "about", "all", "an", "and", "any", "are", "as", "at", "be", "between",
+    "biggest", "by", "can", "customer", "customers", "do", "does", "for", "from",
+    "give", "how", "i", "in", "is", "it", "its", "me", "most", "my", "of", "on",
+    "one", "only", "or", "over", "people", "product", "products", "reviewers",
+    "review", "reviews", "say", "the", "their", "them", "they", "think", "this",
+    "to", "top", "users", "what", "when", "which", "who", "with", "you",
+}
+# Opinion words that show up as top terms but aren't aspects
+_GENERIC = {
+    "bad", "best", "better", "bought", "easy", "get", "good", "great", "like",
+    "love", "loves", "much", "nice", "really", "use", "used", "using", "well",
+    "would", "works", "work",
+}
+ASPECT_LEXICON = {
+    "battery", "charger", "charging", "screen", "display", "price", "value",
+    "sound", "speaker", "audio", "camera", "apps", "app", "speed", "performance",
+    "setup", "wifi", "storage", "size", "weight", "design", "quality", "durability",
+    "alexa", "voice", "remote", "reading", "books", "backlight", "light", "games",
+    "parental", "controls", "kids", "shipping", "packaging", "warranty", "support",
+}
+INTENT_KEYWORDS = [
+    ("compare", {"vs", "versus", "compare", "comparison", "between"}),
+    ("complaints", {"complaint", "complaints", "problem", "problems", "issue", "issues", "dislike"}),
+    ("pros_cons", {"pros", "cons"}),
+    ("positives", {"like", "love", "praise", "positive", "best"}),
+    ("summary", {"summarize", "summary", "overview", "bullet", "bullets", "paragraph"}),
+    ("improvements", {"improve", "improvement", "improvements", "want", "wish"}),
+]
+_SEPARATORS = {"vs", "versus", "and", "or", "between"}
+# Catalogue-name words that describe a device rather than name one
+_DEVICE_WORDS = {
+    "adapter", "all", "amazon", "black", "blue", "bundle", "case", "cover", "device",
+    "edition", "generation", "gen", "hd", "inch", "kit", "new", "pack", "plus", "power",
+    "pro", "smart", "stick", "tablet", "tablets", "tv", "white", "wireless", "with",
+}
+_MODEL_RE = re.compile(r"^(?=.*[a-z])(?=.*\d)(?!\d+(st|nd|rd|th|gb|in|mah)$)[a-z0-9]+$")
+
+
+class FastPlanExtractor:
+    """Local product/aspect/intent extraction from the catalogue and aspect lexicon."""
+
+    def __init__(self, product_index, aspect_terms=()):
+        self.index = product_index
+        n_names = max(len(product_index.names), 1) if product_index else 1
+        generic = _STOP | _GENERIC | ASPECT_LEXICON
+        # Tokens that appear in most catalogue names ("amazon", "new") don't identify
+        # a product, nor do aspect words that happen to be in names ("kids", "screen")
+        self.product_tokens = {
+            t for t, ids in (product_index.postings.items() if product_index else ())
+            if t not in generic and len(ids) / n_names <= 0.5
+        }
+        # Brand tokens lead a catalogue name once device words are skipped
+        # ("Kindle Paperwhite", "All-New Echo Dot"); model tokens mix letters
+        # and digits ("hd8")
+        self.brand_tokens = set()
+        for name in (product_index.names if product_index else ()):
+            words = [w for w in _WORD_RE.findall(name.lower()) if w not in _DEVICE_WORDS]
+            if words and words[0] in self.product_tokens:
+                self.brand_tokens.add(words[0])
+        self.brand_tokens |= {t for t in self.product_tokens if _MODEL_RE.match(t)}
+        self.aspect_terms = (set(aspect_terms) - _GENERIC - _STOP) | ASPECT_LEXICON
+
+    def extract(self, query):
+        """Return ``(plan, confident)``.
+
+        Confident only if every product mention is a multi-word phrase that
+        matches a catalogue name or contains a brand/model token; otherwise
+        the caller should ask the LLM planner.
+        """
+        words = _WORD_RE.findall(query.lower())
+
+        # Contiguous runs of product tokens are product mentions ("fire tablet")
+        products, run, confident = [], [], True
+        for word in words + [""]:
+            if word in self.product_tokens and word not in _SEPARATORS:
+                run.append(word)
+                continue
+            if run:
+                phrase = " ".join(run)
+                if self.index.match(phrase) and phrase not in (p.lower() for p in products):
+                    # Keep the user's spelling ("Fire TV Stick", not "fire tv stick")
+                    found = re.search(r"\b" + r"\W+".join(run) + r"\b", query, re.IGNORECASE)
+                    products.append(found.group(0) if found else phrase)
+                    confident = confident and (len(run) > 1 or run[0] in self.brand_tokens)
+                run = []
+
+        product_words = {w for p in products for w in p.lower().split()}
+        intent = next(
+            (name for name, keys in INTENT_KEYWORDS if keys & set(words)), "general"
+        )
+        if intent == "compare" and len(products) < 2:
+            intent = "general"
+        aspects = [
+            w for w in words
+            if w in self.aspect_terms and w not in product_words
+        ]
+
+        plan = {
+            "product": products if len(products) > 1 else (products[0] if products else None),
+            "aspect": aspects[0] if aspects else None,
+            "intent": intent,
+        }
+        return plan, bool(products) and confident
+
 
 class PlannerAgent:
     SYSTEM_PROMPT = """
@@ -10,10 +124,76 @@ class PlannerAgent:
     Return ONLY JSON.
     """
 
-    def plan(self, user_query: str, memory: dict):
-        user_prompt = f"Query: {user_query}\nMemory: {json.dumps(memory)}"
-        result = chat_completion(self.SYSTEM_PROMPT, user_prompt)
+    def __init__(self, product_index=None, aspect_terms=(), fast_path=True):
+        self.fast_path = fast_path
+        self.use_index(product_index or ProductIndex.load(), aspect_terms)
+        self.fast_hits = 0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+
+    def use_index(self, product_index, aspect_terms=()):
+        """(Re)build the local extractor, e.g. after the catalogue is rebuilt."""
+        self.fast = (
+            FastPlanExtractor(product_index, aspect_terms) if self.fast_path and product_index else None
+        )
+
+    def _user_prompt(self, user_query, memory):
+        return f"Query: {user_query}\nMemory: {json.dumps(memory)}"
+
+    def _parse(self, result, fallback=None):
         try:
-            return json.loads(result)
-        except:
-            return {"product": None, "aspect": None, "intent": result}
+            plan = json.loads(_FENCE_RE.sub("", result.strip()))
+            if isinstance(plan, dict):
+                return plan
+        except json.JSONDecodeError:
+            pass
+        # Unparseable LLM output: keep whatever the local extractor found
+        plan = dict(fallback or {"product": None, "aspect": None})
+        plan["intent"] = result
+        return plan
+
+    def _fast_plan(self, user_query):
+        if self.fast is None:
+            return None, False
+        plan, confident = self.fast.extract(user_query)
+        if confident:
+            self.fast_hits += 1
+        return plan, confident
+
+    def plan(self, user_query: str, memory: dict):
+        with span("planner") as record:
+            fast_plan, confident = self._fast_plan(user_query)
+            record["fast_path"] = confident
+            if confident:
+                return fast_plan
+            t0 = time.perf_counter()
+            result = chat_completion(self.SYSTEM_PROMPT, self._user_prompt(user_query, memory))
+            self._record_llm(time.perf_counter() - t0)
+            return self._parse(result, fast_plan)
+
+    async def aplan(self, user_query: str, memory: dict):
+        with span("planner") as record:
+            fast_plan, confident = self._fast_plan(user_query)
+            record["fast_path"] = confident
+            if confident:
+                return fast_plan
+            t0 = time.perf_counter()
+            result = await achat_completion(self.SYSTEM_PROMPT, self._user_prompt(user_query, memory))
+            self._record_llm(time.perf_counter() - t0)
+            return self._parse(result, fast_plan)
+
+    def _record_llm(self, seconds):
+        self.llm_calls += 1
+        self.llm_seconds += seconds
+
+    def stats(self):
+        """Fast-path hit rate and LLM latency it saved (estimated from LLM calls made)."""
+        total = self.fast_hits + self.llm_calls
+        avg_llm = self.llm_seconds / self.llm_calls if self.llm_calls else None
+        return {
+            "fast_path_hits": self.fast_hits,
+            "llm_calls": self.llm_calls,
+            "fast_path_hit_rate": self.fast_hits / total if total else 0.0,
+            "avg_llm_plan_seconds": avg_llm,
+            "estimated_seconds_saved": self.fast_hits * avg_llm if avg_llm else None,
+        }
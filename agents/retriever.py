@@ -1,15 +1,51 @@
 # agents/retriever.py
 
-import chromadb
-from sentence_transformers import SentenceTransformer
+import time
+import weakref
+
+import resources
+from bm25 import reciprocal_rank_fusion
+from tracing import span
 
 
 class RetrieverAgent:
-    def __init__(self):
-        # Connect to the local ChromaDB persistent store
-        self.client = chromadb.PersistentClient(path="vectorstore")
-        self.collection = self.client.get_collection("reviews")
-        self.embedder = SentenceTransformer("all-MiniLM-L6-v2")
+    def __init__(self, cache=None, hybrid=True, bm25_budget_ms=30, reranker=None):
+        # Model and ChromaDB store are shared process-wide and loaded lazily;
+        # the consumer count drops on close() or when the session is collected
+        resources.attach()
+        self._detach = weakref.finalize(self, resources.detach)
+        # Query -> embedding / results cache, reset whenever the store is rebuilt.
+        # Shared across sessions unless a dedicated one (e.g. disk-backed) is given.
+        self.cache = cache or resources.get_retrieval_cache()
+        # Keyword (BM25) search fused with vector search; skipped if not built
+        self.hybrid = hybrid
+        self.bm25_budget_ms = bm25_budget_ms
+        # Optional second stage (rerank.Reranker): over-fetch, then MMR/cross-encoder
+        self.reranker = reranker
+
+    @property
+    def client(self):
+        return resources.get_client()
+
+    @property
+    def collection(self):
+        return resources.get_collection()
+
+    @property
+    def embedder(self):
+        return resources.get_embedder()
+
+    @property
+    def bm25(self):
+        return resources.get_bm25_index()
+
+    @property
+    def product_index(self):
+        # Planner product -> catalogue names, written by build_vectorstore.py
+        return resources.get_product_index()
+
+    def close(self):
+        self._detach()
 
     def _to_str(self, x):
         """Normalize product/aspect/query into a single string."""
@@ -20,34 +56,224 @@ class RetrieverAgent:
             return " ".join(str(item) for item in x)
         return str(x)
 
-    def retrieve(self, product=None, aspect=None, raw_query=None, top_k=8):
-        # 1️⃣ Normalize all parts to strings
-        product_str = self._to_str(product)
-        aspect_str = self._to_str(aspect)
-        query_str = self._to_str(raw_query)
+    def _compose_query(self, product=None, aspect=None, raw_query=None):
+        # Normalize all parts to strings and build the final search query string
+        parts = [self._to_str(product), self._to_str(aspect), self._to_str(raw_query)]
+        return " ".join([x for x in parts if x])
+
+    def _product_names(self, product):
+        index = self.product_index
+        if index is None:
+            return None
+        return index.match(product) or None
+
+    def _where(self, names):
+        if not names:
+            return None
+        if len(names) == 1:
+            return {"name": names[0]}
+        return {"name": {"$in": names}}
+
+    def product_filter(self, product):
+        """Chroma ``where`` filter restricting a search to the product's reviews."""
+        return self._where(self._product_names(product))
+
+    def retrieve(self, product=None, aspect=None, raw_query=None, top_k=8, min_hits=None):
+        return self.retrieve_batch(
+            [{"product": product, "aspect": aspect, "raw_query": raw_query}],
+            top_k=top_k,
+            min_hits=min_hits,
+        )[0]
+
+    def embed(self, queries):
+        """Encode query strings, reusing cached embeddings where possible."""
+        embeddings = [self.cache.get_embedding(q) for q in queries]
+        missing = [i for i, e in enumerate(embeddings) if e is None]
+        if missing:
+            texts = [queries[i] for i in missing]
+            # Texts the build already embedded come from its on-disk cache,
+            # re-opened after a rebuild so rows it appended are visible
+            resources.check_generation()
+            stored = resources.get_embedding_cache()
+            with span("encode", queries=len(missing)):
+                if stored is not None:
+                    encoded = stored.encode(texts, lambda t: self.embedder.encode(t)).tolist()
+                else:
+                    encoded = self.embedder.encode(texts).tolist()
+            for i, emb in zip(missing, encoded):
+                embeddings[i] = emb
+                self.cache.set_embedding(queries[i], emb)
+        return embeddings
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def _query(self, embeddings, top_k, where=None):
+        fields = ["ids", "documents", "metadatas", "distances"]
+        if self.reranker is not None:
+            # MMR works on the candidates' stored embeddings
+            fields.append("embeddings")
+        kwargs = {"query_embeddings": embeddings, "n_results": top_k, "include": fields[1:]}
+        if where is not None:
+            kwargs["where"] = where
+        with span("vector_query", backend=resources.VECTOR_BACKEND,
+                  queries=len(embeddings), filtered=where is not None):
+            res = self.collection.query(**kwargs)
 
-        # 2️⃣ Build final search query string
-        query = " ".join(
-            [x for x in [product_str, aspect_str, query_str] if x]
-        )
+        # Make sure keys exist and shape is consistent (embeddings may be arrays)
+        empty = [[] for _ in embeddings]
+        columns = {f: empty if res.get(f) is None or len(res[f]) == 0 else res[f] for f in fields}
+        return [{f: columns[f][j] for f in fields} for j in range(len(embeddings))]
 
-        # 3️⃣ Encode and query ChromaDB
-        query_embedding = self.embedder.encode([query])
+    def _fuse(self, hits, query, names, top_k):
+        """Reciprocal-rank fuse vector hits with BM25 hits for the same query."""
+        with span("bm25"):
+            sparse = self.bm25.search(query, top_k=len(hits["ids"]) or top_k,
+                                      names=names, budget_ms=self.bm25_budget_ms)
+        fused = reciprocal_rank_fusion([hits["ids"], [doc_id for doc_id, _ in sparse]])
+        return fused[:top_k]
 
-        res = self.collection.query(
-            query_embeddings=query_embedding.tolist(),
-            n_results=top_k,
-        )
+    def retrieve_batch(self, requests, top_k=8, min_hits=None):
+        """Retrieve for many queries with one encode call and one vector query per filter.
 
-        # 4️⃣ Make sure keys exist and shape is consistent
-        documents = res.get("documents", [[]])
-        metadatas = res.get("metadatas", [[]])
-        distances = res.get("distances", [[]])
+        ``requests`` is a list of dicts with optional product/aspect/raw_query
+        keys. A request whose product maps to catalogue names is searched only
+        within those names; if that yields fewer than ``min_hits`` reviews
+        (default: half of ``top_k``) it falls back to an unfiltered search.
+        With a BM25 index available, vector hits are fused with keyword hits.
+        With a reranker, ``reranker.fetch_k`` vector candidates are fetched,
+        diversified with MMR before fusion and optionally cross-encoded.
+        Returns one result dict per request, in input order.
+        """
+        if not requests:
+            return []
+        with span("retrieve", queries=len(requests)) as record:
+            return self._retrieve_batch(requests, top_k, min_hits, record)
+
+    def _retrieve_batch(self, requests, top_k, min_hits, record):
+        t0 = time.perf_counter()
+        # Reload the collection, BM25 and product indexes after a rebuild
+        resources.check_generation()
+        if min_hits is None:
+            min_hits = max(1, top_k // 2)
+        hybrid = self.hybrid and self.bm25 is not None
+        rerank = self.reranker.key() if self.reranker is not None else None
+        # Over-fetch vector candidates so fusion / reranking has something to re-rank
+        fetch_k = top_k * 2 if hybrid else top_k
+        if rerank:
+            fetch_k = max(fetch_k, self.reranker.fetch_k)
+
+        # 1️⃣ Build final search query strings and product filters
+        queries = [self._compose_query(**r) for r in requests]
+        names = [self._product_names(r.get("product")) for r in requests]
+        wheres = [self._where(n) for n in names]
+
+        # 2️⃣ Serve repeated (query, top_k, filter) lookups from the cache
+        self.cache.check_generation()
+        keys = [
+            self.cache.result_key(q, top_k, min_hits, w, hybrid, rerank)
+            for q, w in zip(queries, wheres)
+        ]
+        results = [self.cache.get_result(k) for k in keys]
+        todo = [i for i, r in enumerate(results) if r is None]
+        record["cache_hit"] = not todo
+
+        if todo:
+            # 3️⃣ Encode all uncached queries in a single batch
+            embeddings = self.embed([queries[i] for i in todo])
+            embeddings = dict(zip(todo, embeddings))
+
+            # 4️⃣ Query ChromaDB once per distinct filter
+            groups = {}
+            for i in todo:
+                groups.setdefault(repr(wheres[i]), (wheres[i], []))[1].append(i)
+
+            for where, idxs in groups.values():
+                for i, hits in zip(idxs, self._query([embeddings[i] for i in idxs], fetch_k, where)):
+                    results[i] = dict(hits, where=where)
+
+            # Fall back to an unfiltered search where the filter was too narrow
+            sparse = [i for i in todo if results[i]["where"] is not None
+                      and len(results[i]["ids"]) < min_hits]
+            if sparse:
+                for i, hits in zip(sparse, self._query([embeddings[i] for i in sparse], fetch_k)):
+                    results[i] = dict(hits, where=None)
+                    names[i] = None
+
+            if rerank:
+                # MMR runs on the vector candidates before keyword hits join, so
+                # fusion still promotes exact-term matches; the cross-encoder
+                # then orders what survives
+                budgets = {i: self.reranker.budget() for i in todo}
+                keep = self.reranker.pool_size(top_k)
+                self._diversify(todo, results, embeddings, max(keep, top_k * 2) if hybrid else keep, budgets)
+                if hybrid:
+                    self._apply_fusion(todo, results, queries, names, keep)
+                if self.reranker.cross_encoder:
+                    self._cross_rank(todo, results, queries, top_k, budgets)
+                for i in todo:
+                    self.reranker.record(budgets[i])
+            elif hybrid:
+                self._apply_fusion(todo, results, queries, names, top_k)
+
+            for i in todo:
+                self.cache.set_result(keys[i], results[i])
+
+        resources.record_query(time.perf_counter() - t0)
 
         # 5️⃣ Return in the format orchestrator expects
-        return {
-            "query": query,
-            "documents": documents,
-            "metadatas": metadatas,
-            "distances": distances,
-        }
+        return [
+            {
+                "query": query,
+                "ids": [r["ids"]],
+                "documents": [r["documents"]],
+                "metadatas": [r["metadatas"]],
+                "distances": [r["distances"]],
+                "where": r["where"],
+            }
+            for query, r in zip(queries, results)
+        ]
+
+    def _apply_fusion(self, todo, results, queries, names, top_k):
+        fused = {i: self._fuse(results[i], queries[i], names[i], top_k) for i in todo}
+
+        # Keyword-only hits aren't in the vector results; fetch them in one call
+        known = {}
+        for i in todo:
+            r = results[i]
+            for j, doc_id in enumerate(r["ids"]):
+                known[doc_id] = (r["documents"][j], r["metadatas"][j], r["distances"][j])
+        missing = sorted({d for ids in fused.values() for d in ids if d not in known})
+        if missing:
+            got = self.collection.get(ids=missing, include=["documents", "metadatas"])
+            for doc_id, doc, meta in zip(got["ids"], got["documents"], got["metadatas"]):
+                known[doc_id] = (doc, meta, None)
+
+        for i in todo:
+            ids = [d for d in fused[i] if d in known]
+            results[i] = {
+                "ids": ids,
+                "documents": [known[d][0] for d in ids],
+                "metadatas": [known[d][1] for d in ids],
+                "distances": [known[d][2] for d in ids],
+                "where": results[i]["where"],
+            }
+
+    @staticmethod
+    def _reorder(result, order):
+        for f in ("ids", "documents", "metadatas", "distances"):
+            result[f] = [result[f][j] for j in order]
+
+    def _diversify(self, todo, results, embeddings, k, budgets):
+        with span("mmr", queries=len(todo), k=k):
+            for i in todo:
+                r = results[i]
+                self._reorder(r, self.reranker.diversify(embeddings[i], r.pop("embeddings"), k, budgets[i]))
+
+    def _cross_rank(self, todo, results, queries, top_k, budgets):
+        with span("cross_encoder", queries=len(todo)) as record:
+            record["scored"] = 0
+            for i in todo:
+                order, scored = self.reranker.cross_rank(queries[i], results[i]["documents"], top_k, budgets[i])
+                self._reorder(results[i], order)
+                record["scored"] += scored
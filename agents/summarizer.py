@@ -1,4 +1,52 @@
-from llm import chat_completion
+import re
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from llm import chat_completion, achat_completion, stream_chat_completion
+from tracing import span, in_context
+
+_NORMALIZE_RE = re.compile(r"[^a-z0-9 ]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+def dedupe_reviews(reviews, threshold=0.9):
+    """Drop exact and near-identical reviews (word-set Jaccard >= threshold)."""
+    kept, kept_sets, seen = [], [], set()
+    for review in reviews:
+        norm = " ".join(_NORMALIZE_RE.sub(" ", str(review).lower()).split())
+        if not norm or norm in seen:
+            continue
+        words = set(norm.split())
+        if any(len(words & s) / len(words | s) >= threshold for s in kept_sets):
+            continue
+        seen.add(norm)
+        kept.append(review)
+        kept_sets.append(words)
+    return kept
+
+
+def pack_reviews(reviews, token_budget):
+    """Split reviews into chunks of at most ``token_budget`` estimated tokens."""
+    chunks, current, used = [], [], 0
+    for review in reviews:
+        cost = estimate_tokens(review)
+        if cost > token_budget:
+            # A single oversized review is truncated to fit on its own
+            review = review[: token_budget * 4]
+            cost = token_budget
+        if current and used + cost > token_budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(review)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
 
 class SummarizerAgent:
     SYSTEM_PROMPT = """
@@ -8,7 +56,95 @@ class SummarizerAgent:
     - Cons
     """
 
-    def summarize(self, reviews, product=None, aspect=None):
+    REDUCE_PROMPT = """
+    Merge these partial review summaries into one summary with:
+    - Sentiment
+    - Pros
+    - Cons
+    Weigh points that recur across partial summaries more heavily.
+    """
+
+    def __init__(self, token_budget=3000, max_parallel=8):
+        # Per-call context budget; larger retrieval sets are map-reduced
+        self.token_budget = token_budget
+        self.max_parallel = max_parallel
+
+    def _user_prompt(self, reviews, product, aspect):
         combined = "\n\n---\n".join(reviews)
-        user_prompt = f"Product: {product}\nAspect: {aspect}\n\nReviews:\n{combined}"
-        return chat_completion(self.SYSTEM_PROMPT, user_prompt)
+        return f"Product: {product}\nAspect: {aspect}\n\nReviews:\n{combined}"
+
+    def _reduce_groups(self, partials):
+        groups = pack_reviews(partials, self.token_budget)
+        if len(groups) == len(partials):
+            # Summaries too long to share a call: merge pairwise so we converge
+            groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+        return groups
+
+    def _reduce_prompt(self, summaries, product, aspect):
+        combined = "\n\n---\n".join(summaries)
+        return f"Product: {product}\nAspect: {aspect}\n\nPartial summaries:\n{combined}"
+
+    def _final_call(self, reviews, product, aspect):
+        """Run the map (and any intermediate reduce) stages; return the last call's prompts."""
+        chunks = pack_reviews(dedupe_reviews(reviews), self.token_budget)
+        if len(chunks) <= 1:
+            return self.SYSTEM_PROMPT, self._user_prompt(chunks[0] if chunks else [], product, aspect)
+
+        # Map: summarize each chunk in parallel
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            # in_context: worker threads would otherwise drop the query's trace
+            partials = list(pool.map(
+                in_context(lambda chunk: chat_completion(
+                    self.SYSTEM_PROMPT, self._user_prompt(chunk, product, aspect)
+                )),
+                chunks,
+            ))
+
+            # Reduce: merge partial summaries until they fit in one call
+            groups = self._reduce_groups(partials)
+            while len(groups) > 1:
+                partials = list(pool.map(
+                    in_context(lambda group: chat_completion(
+                        self.REDUCE_PROMPT, self._reduce_prompt(group, product, aspect)
+                    )),
+                    groups,
+                ))
+                groups = self._reduce_groups(partials)
+        return self.REDUCE_PROMPT, self._reduce_prompt(groups[0], product, aspect)
+
+    def summarize(self, reviews, product=None, aspect=None):
+        with span("summarizer", reviews=len(reviews)):
+            return chat_completion(*self._final_call(reviews, product, aspect))
+
+    def summarize_stream(self, reviews, product=None, aspect=None):
+        """Like summarize, but yields the final summary as text deltas."""
+        with span("summarizer", reviews=len(reviews), stream=True):
+            yield from stream_chat_completion(*self._final_call(reviews, product, aspect))
+
+    async def asummarize(self, reviews, product=None, aspect=None):
+        with span("summarizer", reviews=len(reviews)):
+            return await self._asummarize(reviews, product, aspect)
+
+    async def _asummarize(self, reviews, product=None, aspect=None):
+        chunks = pack_reviews(dedupe_reviews(reviews), self.token_budget)
+        if len(chunks) <= 1:
+            return await achat_completion(
+                self.SYSTEM_PROMPT, self._user_prompt(chunks[0] if chunks else [], product, aspect)
+            )
+
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def call(system_prompt, user_prompt):
+            async with semaphore:
+                return await achat_completion(system_prompt, user_prompt)
+
+        partials = await asyncio.gather(*[
+            call(self.SYSTEM_PROMPT, self._user_prompt(chunk, product, aspect)) for chunk in chunks
+        ])
+        while len(partials) > 1:
+            groups = self._reduce_groups(partials)
+            partials = await asyncio.gather(*[
+                call(self.REDUCE_PROMPT, self._reduce_prompt(group, product, aspect))
+                for group in groups
+            ])
+        return partials[0]
@@ -0,0 +1,91 @@
+import os
+import json
+from collections import Counter
+
+AGGREGATES_FILE = os.path.join("vectorstore", "product_aggregates.json")
+TOP_TERMS = 20
+
+
+class ProductAggregates:
+    """Corpus-level per-product rating stats, precomputed at build time.
+
+    Stored column-wise (one list per field, one row per catalogue ``name``) so
+    the dashboard and AnalystAgent get true corpus stats in a dict lookup
+    instead of approximating from the top_k retrieved reviews.
+    """
+
+    def __init__(self):
+        self._hist = {}
+        self._sum = {}
+        self._terms = {}
+        self.top_terms = {}
+
+    def add_chunk(self, df):
+        """Accumulate one chunk of cleaned reviews (build time)."""
+        for name, rating, text in zip(df["name"], df["reviews.rating"], df["clean_text"]):
+            if not isinstance(name, str):
+                continue
+            hist = self._hist.setdefault(name, [0] * 5)
+            try:
+                r = float(rating)
+            except (TypeError, ValueError):
+                r = None
+            if r is not None and 1 <= r <= 5:
+                hist[int(round(r)) - 1] += 1
+                self._sum[name] = self._sum.get(name, 0.0) + r
+            if isinstance(text, str):
+                self._terms.setdefault(name, Counter()).update(text.split())
+
+    def save(self, path=AGGREGATES_FILE):
+        names = sorted(self._hist)
+        columns = {
+            "name": names,
+            "hist": [self._hist[n] for n in names],
+            "rating_sum": [round(self._sum.get(n, 0.0), 4) for n in names],
+            "top_terms": [
+                [t for t, _ in self._terms.get(n, Counter()).most_common(TOP_TERMS)]
+                for n in names
+            ],
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(columns, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=AGGREGATES_FILE):
+        """Load saved aggregates, or return None if the build hasn't written them."""
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            columns = json.load(f)
+        agg = cls()
+        for i, name in enumerate(columns["name"]):
+            agg._hist[name] = columns["hist"][i]
+            agg._sum[name] = columns["rating_sum"][i]
+            agg.top_terms[name] = columns["top_terms"][i]
+        return agg
+
+    def stats(self, names):
+        """Combined stats for one or more catalogue names (None if unknown)."""
+        names = [n for n in names if n in self._hist]
+        if not names:
+            return None
+        counts = {i: 0 for i in range(1, 6)}
+        total_sum = 0.0
+        terms = Counter()
+        for name in names:
+            for i, c in enumerate(self._hist[name]):
+                counts[i + 1] += c
+            total_sum += self._sum.get(name, 0.0)
+            # Rank-weighted merge of each product's top terms
+            for rank, term in enumerate(self.top_terms.get(name, [])):
+                terms[term] += TOP_TERMS - rank
+        total = sum(counts.values())
+        return {
+            "counts": counts,
+            "total": total,
+            "avg": total_sum / total if total else None,
+            "top_terms": [t for t, _ in terms.most_common(TOP_TERMS)],
+        }
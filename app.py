@@ -2,19 +2,19 @@ import io
 import textwrap
 from typing import List, Dict, Any
 
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
 import streamlit as st
-from wordcloud import WordCloud
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
 
+import llm
+import resources
+import tracing
+from config import METRICS_PORT
 from orchestrator import ReviewInsightOrchestrator
 from memory import ShortTermMemory
 
 
 # ---------- Helpers ----------
+# Charting/PDF libraries are imported inside the helpers that use them so the
+# app starts without paying for matplotlib, wordcloud or reportlab.
 
 def compute_rating_stats(metadatas: List[Dict[str, Any]]) -> Dict[str, Any]:
     ratings = []
@@ -22,7 +22,8 @@ def compute_rating_stats(metadatas: List[Dict[str, Any]]) -> Dict[str, Any]:
         try:
             r = float(str(m.get("reviews.rating", m.get("rating", 0))).strip())
             if 1 <= r <= 5:
-                ratings.append(r)
+                # Deduplicated reviews stand for dup_count identical copies
+                ratings.extend([r] * int(m.get("dup_count", 1)))
         except:
             continue
 
@@ -38,9 +39,11 @@ def compute_rating_stats(metadatas: List[Dict[str, Any]]) -> Dict[str, Any]:
 
 
 def plot_rating_histogram(stats: Dict[str, Any]):
-    if not stats["ratings"]:
+    if not sum(stats["counts"].values()):
         st.info("No rating data available.")
         return
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots()
     xs = list(stats["counts"].keys())
     ys = list(stats["counts"].values())
@@ -52,7 +55,7 @@ def plot_rating_histogram(stats: Dict[str, Any]):
 
 
 def plot_sentiment_pie(stats: Dict[str, Any]):
-    if not stats["ratings"]:
+    if not sum(stats["counts"].values()):
         st.info("No sentiment data available.")
         return
 
@@ -60,6 +63,8 @@ def plot_sentiment_pie(stats: Dict[str, Any]):
     neu = stats["counts"][3]
     neg = sum(c for r, c in stats["counts"].items() if r <= 2)
 
+    import matplotlib.pyplot as plt
+
     labels = ["Positive (4–5★)", "Neutral (3★)", "Negative (1–2★)"]
     sizes = [pos, neu, neg]
 
@@ -74,6 +79,9 @@ def plot_wordcloud(docs: List[str]):
     if not docs:
         st.info("No meaningful text available for word cloud.")
         return
+    import matplotlib.pyplot as plt
+    from wordcloud import WordCloud
+
     text = " ".join(docs)
     wc = WordCloud(width=800, height=400, background_color="white").generate(text)
     fig, ax = plt.subplots(figsize=(8, 4))
@@ -83,6 +91,9 @@ def plot_wordcloud(docs: List[str]):
 
 
 def generate_pdf(summary: str, analysis: str) -> io.BytesIO:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
     buffer = io.BytesIO()
     c = canvas.Canvas(buffer, pagesize=letter)
     width, height = letter
@@ -110,6 +121,18 @@ def generate_pdf(summary: str, analysis: str) -> io.BytesIO:
 
 st.set_page_config(page_title="Customer Review Insight Agent", layout="wide")
 
+
+@st.cache_resource
+def warm_up_resources():
+    # Runs once per process: start loading the shared model/collection early
+    resources.warm_up(background=True)
+    if METRICS_PORT:
+        tracing.serve_metrics(port=METRICS_PORT)
+    return True
+
+
+warm_up_resources()
+
 if "short_memory" not in st.session_state:
     st.session_state.short_memory = ShortTermMemory()
 
@@ -159,6 +182,16 @@ st.sidebar.markdown("---")
 st.sidebar.subheader("🧠 Short-term Memory")
 st.sidebar.json(short_memory.get_all())
 
+with st.sidebar.expander("🧩 Shared resources", expanded=False):
+    st.json(resources.stats())
+    st.json({"retrieval_cache": orchestrator.retriever.cache_stats()})
+    st.json({"planner": orchestrator.planner.stats()})
+    if orchestrator.retriever.reranker is not None:
+        st.json({"reranker": orchestrator.retriever.reranker.stats()})
+    st.json({"llm_client": llm.caller.stats()})
+
+show_debug = st.sidebar.checkbox("🐞 Debug panel (latency trace)")
+
 
 # ---------- Main App ----------
 
@@ -171,7 +204,14 @@ def run_query(query: str):
         query = f"For product {product_focus}, {query}"
 
     with st.spinner("Analyzing reviews..."):
-        return orchestrator.run(user_query=query, short_memory=short_memory)
+        # run_async closes this loop's OpenAI client; each call gets a fresh loop
+        return llm.run_async(orchestrator.arun(user_query=query, short_memory=short_memory))
+
+
+def run_query_stream(query: str):
+    if product_focus != "Auto-detect":
+        query = f"For product {product_focus}, {query}"
+    return orchestrator.run_stream(user_query=query, short_memory=short_memory)
 
 
 # ========== Mode: SINGLE QUERY ==========
@@ -201,15 +241,39 @@ else:
         with st.chat_message("user"):
             st.markdown(chat_query)
 
-        result = run_query(chat_query)
+        # Render each stage as it arrives instead of waiting for the whole pipeline
+        with st.chat_message("assistant"):
+            status = st.empty()
+            answer_box = st.empty()
+            summary_text, analysis_text = "", ""
+            status.caption("🧭 Planning…")
+
+            for event in run_query_stream(chat_query):
+                if event["type"] == "plan":
+                    status.caption(f"🔍 Retrieving reviews for {event['plan'].get('product') or 'your query'}…")
+                elif event["type"] == "docs":
+                    status.caption(f"📝 Summarizing {len(event['docs'])} reviews…")
+                elif event["type"] == "summary_delta":
+                    summary_text += event["text"]
+                    answer_box.markdown(f"### Summary\n{summary_text}▌")
+                elif event["type"] == "analysis_delta":
+                    if not analysis_text:
+                        status.caption("📈 Analyzing sentiment…")
+                    analysis_text += event["text"]
+                    answer_box.markdown(
+                        f"### Summary\n{summary_text}\n\n### Insights\n{analysis_text}▌"
+                    )
+                elif event["type"] == "done":
+                    result = event["result"]
+
+            status.empty()
+            answer_text = (
+                f"### Summary\n{result['summary']}\n\n"
+                f"### Insights\n{result['analysis']}"
+            )
+            answer_box.markdown(answer_text)
 
-        answer_text = (
-            f"### Summary\n{result['summary']}\n\n"
-            f"### Insights\n{result['analysis']}"
-        )
         st.session_state.chat_history.append({"role": "assistant", "content": answer_text})
-        with st.chat_message("assistant"):
-            st.markdown(answer_text)
 
         st.session_state.last_result = result
 
@@ -258,7 +322,14 @@ if result:
 
     # Visual Analytics
     with st.expander("📊 Visual Analytics (Charts)", expanded=False):
-        stats = compute_rating_stats(metadatas)
+        # Prefer precomputed corpus-level stats; fall back to the retrieved sample
+        corpus_stats = result.get("corpus_stats")
+        if corpus_stats:
+            stats = corpus_stats
+            st.caption(f"Based on all {corpus_stats['total']} reviews of this product.")
+        else:
+            stats = compute_rating_stats(metadatas)
+            st.caption("Based on the retrieved reviews only.")
 
         col_a, col_b, col_c = st.columns(3)
         with col_a:
@@ -278,3 +349,13 @@ if result:
     # Word Cloud
     with st.expander("☁️ Word Cloud (Top Terms)", expanded=False):
         plot_wordcloud(docs)
+
+    # Debug: per-stage latency for this answer and process-wide averages
+    if show_debug:
+        with st.expander("🐞 Latency Trace", expanded=True):
+            trace = result.get("trace")
+            if trace:
+                st.markdown(f"**Total:** {trace['duration_ms']:.0f} ms")
+                st.dataframe(trace["spans"], use_container_width=True)
+            st.markdown("**Process-wide mean latency per stage**")
+            st.json(tracing.stage_summary())
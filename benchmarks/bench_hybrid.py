@@ -0,0 +1,90 @@
+"""Recall@k and latency: vector-only vs hybrid (BM25 + vector) retrieval.
+
+Needs a built vectorstore (including vectorstore/bm25). Queries are
+generated from stored reviews: each query is a few of a review's rarest
+terms, and that review is the one relevant hit — the "exact aspect term"
+case ("charger", "paperwhite", model numbers) hybrid search targets.
+
+Usage:
+    python -m benchmarks.bench_hybrid [--queries 200] [--k 8] [--json hybrid.json]
+"""
+import json
+import random
+import argparse
+import time
+
+import numpy as np
+
+import resources
+from bm25 import tokenize
+from agents.retriever import RetrieverAgent
+from retrieval_cache import RetrievalCache
+
+
+def make_queries(n, terms_per_query, seed=0):
+    bm25 = resources.get_bm25_index()
+    if bm25 is None:
+        raise SystemExit("No BM25 index found; run build_vectorstore.py first.")
+    rng = random.Random(seed)
+    sample = rng.sample(range(bm25.n_docs), min(n * 3, bm25.n_docs))
+    ids = [bm25.doc_keys[i].decode("ascii") for i in sample]
+    got = resources.get_collection().get(ids=ids, include=["documents"])
+
+    queries = []
+    for doc_id, text in zip(got["ids"], got["documents"]):
+        terms = [t for t in set(tokenize(text)) if t in bm25.vocab]
+        if len(terms) < terms_per_query:
+            continue
+        df = {t: bm25.indptr[bm25.vocab[t] + 1] - bm25.indptr[bm25.vocab[t]] for t in terms}
+        rare = sorted(terms, key=df.get)[:terms_per_query]
+        queries.append((" ".join(rare), doc_id))
+        if len(queries) == n:
+            break
+    return queries
+
+
+def evaluate(retriever, queries, k):
+    hits, latencies = 0, []
+    for query, relevant in queries:
+        t0 = time.perf_counter()
+        res = retriever.retrieve(raw_query=query, top_k=k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        hits += relevant in res["ids"][0]
+    lat = np.array(latencies)
+    return {
+        f"recall@{k}": hits / len(queries),
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--terms", type=int, default=2, help="Rare terms per generated query.")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--budget-ms", type=float, default=30)
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries, args.terms)
+    print(f"Generated {len(queries)} queries.")
+    resources.get_embedder()  # keep model load out of the latency numbers
+
+    results = {}
+    for label, hybrid in [("vector", False), ("hybrid", True)]:
+        retriever = RetrieverAgent(cache=RetrievalCache(), hybrid=hybrid,
+                                   bm25_budget_ms=args.budget_ms)
+        results[label] = evaluate(retriever, queries, args.k)
+        r = results[label]
+        print(f"{label:>7}: recall@{args.k}={r[f'recall@{args.k}']:.3f} "
+              f"p50={r['p50_ms']:.1f}ms p95={r['p95_ms']:.1f}ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
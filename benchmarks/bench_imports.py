@@ -0,0 +1,79 @@
+"""Import-time benchmark: cold-start cost of each project module.
+
+Every module is imported in a fresh interpreter so results are not skewed
+by modules already loaded by an earlier import.
+
+Usage:
+    python -m benchmarks.bench_imports [--repeat 3] [--json import_times.json]
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+MODULES = [
+    "config",
+    "llm",
+    "preprocess",
+    "resources",
+    "agents",
+    "memory",
+    "orchestrator",
+    "app",
+]
+
+# Prints the seconds spent importing the module, or "ERR <reason>"
+_PROBE = """
+import sys, time
+t0 = time.perf_counter()
+try:
+    import {module}
+except BaseException as e:
+    print("ERR", type(e).__name__, e)
+    sys.exit(0)
+print(time.perf_counter() - t0)
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_import(module, repeat):
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module)],
+            cwd=ROOT, capture_output=True, text=True,
+        ).stdout.strip().splitlines()
+        last = out[-1] if out else "ERR no output"
+        if last.startswith("ERR"):
+            return None, last[4:]
+        secs = float(last)
+        best = secs if best is None else min(best, secs)
+    return best, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", default=None, help="Write results to this JSON file.")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.modules:
+        secs, err = time_import(module, args.repeat)
+        results[module] = {"seconds": secs, "error": err}
+        if err:
+            print(f"{module:>14}: failed ({err})")
+        else:
+            print(f"{module:>14}: {secs * 1000:8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
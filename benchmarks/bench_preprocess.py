@@ -0,0 +1,87 @@
+"""Parity check and throughput benchmark: preprocess_text vs clean_texts.
+
+Exits with status 1 if any text cleans differently on the two paths.
+
+Uses real review text when a CSV is given or found in data/; the synthetic
+fallback mixes in curly quotes, ellipses, dashes and "*" as real reviews do.
+
+Usage:
+    python -m benchmarks.bench_preprocess [--rows 20000] [--csv data/reviews.csv]
+"""
+import sys
+import glob
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from preprocess import preprocess_text, fast_preprocess_text, clean_texts
+
+SAMPLE_SENTENCES = [
+    "I don't like the screen, it's too dim!",
+    "Can't wait... great (really) product; 10/10 would buy again.",
+    "The e-reader is 1,000 times better than paper: yes.",
+    "Kindle's battery lasts for weeks, \"amazing\" stuff.",
+    "I cannot believe it's gonna work with my Echo Dot.",
+    "Price: $99.99 & free shipping. Arrived on time",
+    "Won't charge?? Returned it after 2 days",
+    "Bought this for my kids and they love it",
+    "I “love” my new Kindle… it’s great!",
+    "‘Great’ screen — battery could be better *sigh*",
+    "Echo Dot – works with Alexa; 5* would recommend«»",
+    "Don’t buy… the charger’s “fast” mode is **slow**",
+    "Fire tablet for kids: parental controls are… ok-ish",
+]
+
+
+def load_texts(rows, csv=None):
+    csv = csv or next(iter(sorted(glob.glob("data/*.csv"))), None)
+    if csv:
+        print(f"Using review text from {csv}")
+        df = pd.read_csv(csv, usecols=["reviews.text"], nrows=rows)
+        return df["reviews.text"].astype(str).tolist()
+    rng = random.Random(0)
+    return [" ".join(rng.choices(SAMPLE_SENTENCES, k=3)) for _ in range(rows)]
+
+
+def check_parity(texts):
+    mismatches = [t for t in texts if preprocess_text(t) != fast_preprocess_text(t)]
+    rate = len(mismatches) / len(texts) if texts else 0.0
+    print(f"Parity: {len(texts) - len(mismatches)}/{len(texts)} identical ({rate:.2%} mismatched)")
+    for t in mismatches[:5]:
+        print(f"  - text: {t[:80]!r}")
+        print(f"    nltk: {preprocess_text(t)[:80]!r}")
+        print(f"    fast: {fast_preprocess_text(t)[:80]!r}")
+    return rate
+
+
+def timed(label, fn, n):
+    t0 = time.perf_counter()
+    fn()
+    secs = time.perf_counter() - t0
+    print(f"{label:>28}: {secs:.2f}s ({n / secs:,.0f} rows/sec)")
+    return secs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--csv", default=None, help="Benchmark on real review text instead of synthetic.")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    texts = load_texts(args.rows, args.csv)
+    mismatched = check_parity(texts)
+
+    print("\nThroughput:")
+    base = timed("preprocess_text (apply)", lambda: pd.Series(texts).apply(preprocess_text), len(texts))
+    single = timed("clean_texts (1 process)", lambda: clean_texts(texts, workers=1), len(texts))
+    multi = timed("clean_texts (process pool)", lambda: clean_texts(texts, workers=args.workers), len(texts))
+    print(f"\nSpeedup: {base / single:.1f}x single-process, {base / multi:.1f}x pooled")
+    if mismatched:
+        sys.exit("FAILED: fast_preprocess_text does not match preprocess_text")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Latency vs retrieval quality for the MMR / cross-encoder reranking stage.
+
+Needs a built vectorstore (including vectorstore/bm25). Queries come from
+bench_hybrid: a few rare terms of a stored review, which is the one
+relevant hit. Quality is reported as recall@k of that review plus the
+intra-list similarity of the top k (mean pairwise cosine, lower = less
+redundant context for the summarizer); ``prompt_tokens`` estimates the
+summarizer input the top k would cost (~4 characters per token).
+
+Usage:
+    python -m benchmarks.bench_rerank [--queries 200] [--k 8] [--budget-ms 10 50] [--cross]
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+
+import resources
+from rerank import Reranker
+from agents.retriever import RetrieverAgent
+from retrieval_cache import RetrievalCache
+from benchmarks.bench_hybrid import make_queries
+
+
+def intra_list_similarity(collection, ids):
+    if len(ids) < 2:
+        return 0.0
+    got = collection.get(ids=ids, include=["embeddings"])
+    emb = np.asarray(got["embeddings"], dtype=np.float32)
+    emb = emb / np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+    sims = emb @ emb.T
+    n = len(emb)
+    return float((sims.sum() - np.trace(sims)) / (n * (n - 1)))
+
+
+def evaluate(retriever, queries, k):
+    collection = resources.get_collection()
+    hits, latencies, ils, chars = 0, [], [], []
+    for query, relevant in queries:
+        t0 = time.perf_counter()
+        res = retriever.retrieve(raw_query=query, top_k=k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        ids = res["ids"][0]
+        hits += relevant in ids
+        ils.append(intra_list_similarity(collection, ids))
+        chars.append(sum(len(d or "") for d in res["documents"][0]))
+    lat = np.array(latencies)
+    out = {
+        f"recall@{k}": hits / len(queries),
+        "intra_list_sim": float(np.mean(ils)),
+        "prompt_tokens": float(np.mean(chars)) / 4,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+    }
+    reranker = retriever.reranker
+    if reranker is not None:
+        out["degraded_rate"] = reranker.stats()["degraded_rate"]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--terms", type=int, default=2, help="Rare terms per generated query.")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--fetch-k", type=int, default=100)
+    parser.add_argument("--lambdas", type=float, nargs="+", default=[0.5, 0.7])
+    parser.add_argument("--budget-ms", type=float, nargs="+", default=[10, 50])
+    parser.add_argument("--cross", action="store_true", help="Also time MMR + cross-encoder.")
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries, args.terms)
+    print(f"Generated {len(queries)} queries.")
+    resources.get_embedder()  # keep model loads out of the latency numbers
+    if args.cross:
+        resources.get_cross_encoder()
+
+    variants = [("baseline", None)]
+    for budget in args.budget_ms:
+        for lam in args.lambdas:
+            variants.append((f"mmr-l{lam:g}-{budget:g}ms", dict(lambda_mult=lam, budget_ms=budget)))
+        if args.cross:
+            variants.append((f"cross-{budget:g}ms", dict(lambda_mult=max(args.lambdas),
+                                                         budget_ms=budget, cross_encoder=True)))
+
+    results = {}
+    for label, options in variants:
+        reranker = Reranker(fetch_k=args.fetch_k, **options) if options else None
+        retriever = RetrieverAgent(cache=RetrievalCache(), reranker=reranker)
+        results[label] = r = evaluate(retriever, queries, args.k)
+        degraded = f" degraded={r['degraded_rate']:.1%}" if "degraded_rate" in r else ""
+        print(f"{label:>18}: recall@{args.k}={r[f'recall@{args.k}']:.3f} ils={r['intra_list_sim']:.3f} "
+              f"prompt~{r['prompt_tokens']:.0f}tok p50={r['p50_ms']:.1f}ms p95={r['p95_ms']:.1f}ms{degraded}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Chroma vs the local memory-mapped engine: overlap@k, latency and vector bytes.
+
+Needs a built Chroma vectorstore. Each local variant (dtype, IVF lists) is
+exported to a scratch directory; queries are stored review embeddings with
+a little noise, and Chroma's results are the reference.
+
+Usage:
+    python -m benchmarks.bench_vector_backends [--queries 200] [--k 8] [--nlist 0 256]
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+import resources
+from vector_store import LocalCollection, export_collection
+
+
+def sample_queries(collection, n, noise, seed=0):
+    total = collection.count()
+    rng = np.random.default_rng(seed)
+    offsets = rng.choice(total, size=min(n, total), replace=False)
+    queries = []
+    for offset in offsets:
+        emb = np.asarray(collection.get(include=["embeddings"], limit=1, offset=int(offset))["embeddings"][0])
+        queries.append(emb + noise * rng.standard_normal(emb.shape))
+    return np.asarray(queries, dtype=np.float32)
+
+
+def run(collection, queries, k):
+    ids, latencies = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        res = collection.query(query_embeddings=[q.tolist()], n_results=k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        ids.append(res["ids"][0])
+    return ids, np.asarray(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--dtypes", nargs="+", default=["float32", "float16", "int8"])
+    parser.add_argument("--nlist", type=int, nargs="+", default=[0])
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    chroma = resources.get_client().get_collection(resources.COLLECTION_NAME)
+    queries = sample_queries(chroma, args.queries, args.noise)
+    reference, lat = run(chroma, queries, args.k)
+    results = {"chroma": {"p50_ms": float(np.percentile(lat, 50)), "p95_ms": float(np.percentile(lat, 95))}}
+    print(f"{'chroma':>16}: p50={results['chroma']['p50_ms']:.2f}ms p95={results['chroma']['p95_ms']:.2f}ms")
+
+    scratch = tempfile.mkdtemp(prefix="vector_backends_")
+    try:
+        for nlist in args.nlist:
+            for dtype in args.dtypes:
+                label = f"local-{dtype}" + (f"-ivf{nlist}" if nlist else "")
+                path = os.path.join(scratch, label)
+                export_collection(chroma, path, dtype=dtype, nlist=nlist)
+                local = LocalCollection(path, nprobe=args.nprobe)
+                ids, lat = run(local, queries, args.k)
+                overlap = np.mean([len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(ids, reference)])
+                results[label] = {
+                    f"overlap@{args.k}": float(overlap),
+                    "p50_ms": float(np.percentile(lat, 50)),
+                    "p95_ms": float(np.percentile(lat, 95)),
+                    "vector_mb": os.path.getsize(os.path.join(path, "vectors.npy")) / 1e6,
+                }
+                r = results[label]
+                print(f"{label:>16}: overlap@{args.k}={r[f'overlap@{args.k}']:.3f} "
+                      f"p50={r['p50_ms']:.2f}ms p95={r['p95_ms']:.2f}ms vectors={r['vector_mb']:.1f}MB")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Serves ``POST /v1/chat/completions`` (plain and streamed) with configurable
+latency and injected failures, so retries, backoff, timeouts and the
+circuit breaker can be exercised without network access:
+
+    python -m benchmarks.fake_llm_server --port 8765 --error-rate 0.3 --latency 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake streamlit run app.py
+
+``--fail-first N`` makes the first N requests fail with ``--error-status``.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, error_rate=0.0, error_status=503,
+                 fail_first=0, hang_rate=0.0, reply="Fake summary."):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fail_first = fail_first
+        self.hang_rate = hang_rate
+        self.reply = reply
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server._lock:
+            server.requests += 1
+            n = server.requests
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if self.path.rstrip("/") != "/v1/chat/completions":
+                self._json(404, {"error": {"message": "not found"}})
+                return
+            if random.random() < server.hang_rate:
+                time.sleep(3600)
+            time.sleep(server.latency)
+            if n <= server.fail_first or random.random() < server.error_rate:
+                self._json(server.error_status, {"error": {"message": "injected failure"}},
+                           headers={"Retry-After": "0"} if server.error_status == 429 else None)
+                return
+            if body.get("stream"):
+                self._stream(body)
+            else:
+                self._json(200, self._completion(body))
+        finally:
+            with server._lock:
+                server.in_flight -= 1
+
+    def _completion(self, body):
+        prompt_tokens = sum(len(m.get("content", "")) // 4 + 1 for m in body.get("messages", []))
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.server.reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(self.server.reply) // 4 + 1,
+                "total_tokens": prompt_tokens + len(self.server.reply) // 4 + 1,
+            },
+        }
+
+    def _stream(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        full = self._completion(body)
+        base = {k: full[k] for k in ("id", "created", "model")}
+        for word in self.server.reply.split(" "):
+            chunk = dict(base, object="chat.completion.chunk", choices=[
+                {"index": 0, "delta": {"content": word + " "}, "finish_reason": None}
+            ])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        usage = dict(base, object="chat.completion.chunk", choices=[], usage=full["usage"])
+        self.wfile.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode())
+        self.close_connection = True
+
+    def _json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start(port=0, **options):
+    """Run a FakeLLMServer on a daemon thread; returns the server."""
+    server = FakeLLMServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, name="fake-llm", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--fail-first", type=int, default=0)
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="fraction of requests that never answer")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(
+        ("127.0.0.1", args.port), latency=args.latency, error_rate=args.error_rate,
+        error_status=args.error_status, fail_first=args.fail_first, hang_rate=args.hang_rate,
+    )
+    print(f"🤖 Fake LLM server on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
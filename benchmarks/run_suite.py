@@ -0,0 +1,289 @@
+"""Offline benchmark suite on a synthetic corpus; results go to JSON.
+
+Stages (each can be skipped with --skip):
+  preprocess    preprocess_text / fast_preprocess_text / clean_texts rows/sec
+  encode        embedder rows/sec per batch size
+  ingest        collection.add rows/sec into a fresh store (+ BM25/product indexes)
+  retrieve      RetrieverAgent.retrieve p50/p95/p99 per top_k
+  orchestrator  end-to-end latency with a stubbed LLM (llm.set_client)
+
+Everything runs inside --workdir (vectorstore, caches, memory), never the
+project's own store. Nothing touches the network: the embedding model and
+NLTK data must already be on disk, and the LLM is stubbed. Ingest uses
+random unit vectors so 5M-row runs don't spend hours encoding; vector
+search cost doesn't depend on what the vectors encode.
+
+Usage:
+    python -m benchmarks.run_suite --rows 10000 --json bench_results.json
+    python -m benchmarks.run_suite --rows 5000000 --skip encode orchestrator
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import subprocess
+
+# Offline before any project / Hugging Face import reads the environment
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+os.environ["LLM_CACHE_ENABLED"] = "0"
+
+import numpy as np
+
+from benchmarks import synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ["preprocess", "encode", "ingest", "retrieve", "orchestrator"]
+
+
+def percentiles(latencies_ms):
+    lat = np.asarray(latencies_ms, dtype=float)
+    return {
+        "n": int(lat.size),
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "mean_ms": float(lat.mean()),
+    }
+
+
+def rate(rows, seconds):
+    return {"rows": rows, "seconds": round(seconds, 4), "rows_per_sec": rows / seconds if seconds else None}
+
+
+def sample_texts(n, seed=0):
+    return synthetic.generate_chunk(n, seed)["reviews.text"].tolist()
+
+
+# ---------- Stages ----------
+
+def bench_preprocess(args):
+    from preprocess import preprocess_text, fast_preprocess_text, clean_texts
+
+    texts = sample_texts(min(args.rows, args.sample))
+    results = {}
+    for label, fn in [
+        ("preprocess_text", lambda: [preprocess_text(t) for t in texts]),
+        ("fast_preprocess_text", lambda: [fast_preprocess_text(t) for t in texts]),
+        ("clean_texts", lambda: clean_texts(texts)),
+    ]:
+        t0 = time.perf_counter()
+        fn()
+        results[label] = rate(len(texts), time.perf_counter() - t0)
+        print(f"  {label:>22}: {results[label]['rows_per_sec']:,.0f} rows/sec")
+    return results
+
+
+def bench_encode(args):
+    import resources
+
+    model = resources.get_embedder()
+    texts = sample_texts(min(args.rows, args.encode_sample))
+    model.encode(texts[:64], show_progress_bar=False)  # warm-up
+
+    results = {}
+    for batch_size in args.batch_sizes:
+        t0 = time.perf_counter()
+        model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+        results[str(batch_size)] = rate(len(texts), time.perf_counter() - t0)
+        print(f"  batch {batch_size:>4}: {results[str(batch_size)]['rows_per_sec']:,.0f} rows/sec")
+    return results
+
+
+def bench_ingest(args):
+    import chromadb
+    import resources
+    from aggregates import ProductAggregates, AGGREGATES_FILE
+    from bm25 import BM25Builder, BM25_DIR
+    from build_vectorstore import review_id, BATCH_SIZE
+    from preprocess import iter_reviews
+    from product_index import ProductIndex, PRODUCT_INDEX_FILE
+
+    synthetic.write_corpus("data", args.rows, seed=args.seed)
+    client = chromadb.PersistentClient(path=resources.VECTOR_PATH)
+    collection = client.get_or_create_collection(resources.COLLECTION_NAME)
+    rng = np.random.default_rng(args.seed)
+
+    aggregates, bm25, names = ProductAggregates(), BM25Builder(), set()
+    add_secs, other_secs, read = 0.0, 0.0, 0
+    # Throughput counts rows actually inserted, not rows handed to add()
+    before = collection.count()
+    t_all = time.perf_counter()
+    for chunk in iter_reviews("data", chunksize=BATCH_SIZE):
+        t0 = time.perf_counter()
+        ids = [review_id(n, t, r) for n, t, r in
+               zip(chunk["name"], chunk["clean_text"], chunk["reviews.rating"])]
+        chunk["id"] = ids
+        chunk = chunk.drop_duplicates(subset="id")
+        names.update(chunk["name"].dropna())
+        aggregates.add_chunk(chunk)
+        bm25.add(chunk["id"], chunk["clean_text"], chunk["name"])
+        vectors = rng.standard_normal((len(chunk), args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        other_secs += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        collection.add(
+            ids=chunk["id"].tolist(),
+            documents=chunk["clean_text"].tolist(),
+            metadatas=chunk[["name", "reviews.rating", "source"]].to_dict(orient="records"),
+            embeddings=vectors.tolist(),
+        )
+        add_secs += time.perf_counter() - t0
+        read += len(chunk)
+    rows = collection.count() - before
+
+    t0 = time.perf_counter()
+    ProductIndex(names).save(PRODUCT_INDEX_FILE)
+    aggregates.save(AGGREGATES_FILE)
+    bm25.save(BM25_DIR)
+    resources.write_generation()
+    index_secs = time.perf_counter() - t0
+
+    results = {
+        "collection_add": rate(rows, add_secs),
+        "end_to_end": rate(rows, time.perf_counter() - t_all),
+        "rows_read": read,
+        "rows_inserted": rows,
+        "index_write_seconds": round(index_secs, 4),
+        "prepare_seconds": round(other_secs, 4),
+    }
+    print(f"  collection.add: {results['collection_add']['rows_per_sec']:,.0f} rows/sec "
+          f"({rows:,} rows inserted of {read:,} read)")
+    return results
+
+
+def bench_retrieve(args):
+    import resources
+    from agents.retriever import RetrieverAgent
+    from retrieval_cache import RetrievalCache
+
+    resources.get_embedder()
+    resources.get_collection()
+    queries = synthetic.sample_queries(args.queries, args.seed)
+
+    results = {}
+    for top_k in args.top_k:
+        # A fresh cache per top_k so every query pays for encode + search
+        retriever = RetrieverAgent(cache=RetrievalCache())
+        retriever.retrieve(raw_query="warm up", top_k=top_k)
+        latencies = []
+        for q in queries:
+            t0 = time.perf_counter()
+            retriever.retrieve(raw_query=q, top_k=top_k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        results[str(top_k)] = percentiles(latencies)
+        r = results[str(top_k)]
+        print(f"  top_k {top_k:>3}: p50={r['p50_ms']:.1f}ms p95={r['p95_ms']:.1f}ms p99={r['p99_ms']:.1f}ms")
+    return results
+
+
+def bench_orchestrator(args):
+    import llm
+    import tracing
+    from benchmarks.stub_llm import StubClient, AsyncStubClient
+    from memory import ShortTermMemory
+    from orchestrator import ReviewInsightOrchestrator
+
+    latency = args.llm_latency_ms / 1000
+    llm.set_client(StubClient(latency), AsyncStubClient(latency))
+    orchestrator = ReviewInsightOrchestrator()
+    queries = synthetic.sample_queries(args.orchestrator_queries, args.seed + 1)
+    orchestrator.run(queries[0], ShortTermMemory())  # warm-up
+    tracing.reset()
+
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        orchestrator.run(q, ShortTermMemory())
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    results = {
+        "llm_latency_ms": args.llm_latency_ms,
+        "run": percentiles(latencies),
+        "stages": tracing.stage_summary(),
+        "planner": orchestrator.planner.stats(),
+    }
+    r = results["run"]
+    print(f"  run: p50={r['p50_ms']:.1f}ms p95={r['p95_ms']:.1f}ms p99={r['p99_ms']:.1f}ms")
+    return results
+
+
+BENCHES = {
+    "preprocess": bench_preprocess,
+    "encode": bench_encode,
+    "ingest": bench_ingest,
+    "retrieve": bench_retrieve,
+    "orchestrator": bench_orchestrator,
+}
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000, help="Synthetic corpus size (10k - 5M).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="Defaults to a fresh temp directory.")
+    parser.add_argument("--skip", nargs="*", default=[], choices=STAGES)
+    parser.add_argument("--sample", type=int, default=20_000, help="Texts for the preprocess stage.")
+    parser.add_argument("--encode-sample", type=int, default=2_000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--dim", type=int, default=384, help="Vector size for ingest (MiniLM: 384).")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--orchestrator-queries", type=int, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--json", default="bench_results.json")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json)
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="review_bench_"))
+    os.makedirs(workdir, exist_ok=True)
+    sys.path.insert(0, ROOT)
+    # All relative paths (vectorstore/, memory/, .cache/) now resolve inside workdir
+    os.chdir(workdir)
+    random.seed(args.seed)
+
+    report = {
+        "meta": {
+            "rows": args.rows,
+            "seed": args.seed,
+            "workdir": workdir,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.time(),
+        },
+    }
+    print(f"🏁 Benchmarking on {args.rows:,} synthetic rows in {workdir}")
+    for stage in STAGES:
+        if stage in args.skip:
+            continue
+        print(f"\n=== {stage} ===")
+        try:
+            report[stage] = BENCHES[stage](args)
+        except Exception as e:
+            # Record and carry on, e.g. a model or NLTK resource isn't cached locally
+            print(f"  ⚠ {stage} failed: {type(e).__name__}: {e}")
+            report[stage] = {"error": f"{type(e).__name__}: {e}"}
+
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Saved: {json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""In-process stand-ins for the OpenAI clients, for offline benchmarks.
+
+Install them with ``llm.set_client(StubClient(), AsyncStubClient())``; each
+call sleeps ``latency`` seconds and returns a canned reply (plain, streamed
+or, for the planner prompt, a JSON plan) with usage counts.
+"""
+import time
+import asyncio
+from types import SimpleNamespace
+
+PLAN_REPLY = '{"product": null, "aspect": null, "intent": "general"}'
+TEXT_REPLY = (
+    "Sentiment: mostly positive. Pros: long battery life, clear screen, good value. "
+    "Cons: occasional slowdowns, limited apps."
+)
+
+
+def _reply(messages):
+    system = messages[0]["content"] if messages else ""
+    return PLAN_REPLY if "Return ONLY JSON" in system else TEXT_REPLY
+
+
+def _usage(messages, reply):
+    prompt = sum(len(m["content"]) for m in messages) // 4 + 1
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=len(reply) // 4 + 1)
+
+
+def _completion(messages):
+    reply = _reply(messages)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=reply))],
+        usage=_usage(messages, reply),
+    )
+
+
+def _stream(messages):
+    reply = _reply(messages)
+    for word in reply.split(" "):
+        delta = SimpleNamespace(delta=SimpleNamespace(content=word + " "))
+        yield SimpleNamespace(choices=[delta], usage=None)
+    yield SimpleNamespace(choices=[], usage=_usage(messages, reply))
+
+
+class _Completions:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def create(self, messages, stream=False, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return _stream(messages) if stream else _completion(messages)
+
+
+class _AsyncCompletions(_Completions):
+    async def create(self, messages, stream=False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return _completion(messages)
+
+
+class StubClient:
+    def __init__(self, latency=0.0):
+        self.chat = SimpleNamespace(completions=_Completions(latency))
+
+
+class AsyncStubClient:
+    def __init__(self, latency=0.0):
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(latency))
@@ -0,0 +1,139 @@
+"""Synthetic review corpus in the Datafiniti CSV layout the build reads.
+
+Rows are assembled from product names, aspects and opinion phrases whose
+ratings line up with the phrase sentiment, so retrieval, product filters
+and rating stats behave like they do on the real data. Each text ends in a
+row-number reference, so every row gets its own content-hash ID and large
+runs really insert that many vectors. Rows are generated and written in
+chunks, so 5M rows never sit in memory at once.
+
+Usage:
+    python -m benchmarks.synthetic --rows 100000 --out bench_data
+"""
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# (short name reviewers use, catalogue name)
+PRODUCTS = [
+    ("Kindle", "All-New Kindle E-reader - Black, 6\" Glare-Free Touchscreen Display, Wi-Fi"),
+    ("Kindle Paperwhite", "Kindle Paperwhite E-reader - Black, 6\" High-Resolution Display, Wi-Fi"),
+    ("Kindle Oasis", "Kindle Oasis E-reader with Leather Charging Cover"),
+    ("Fire Tablet", "Fire Tablet, 7 Display, Wi-Fi, 8 GB - Includes Special Offers, Black"),
+    ("Fire HD 8", "Fire HD 8 Tablet with Alexa, 8\" HD Display, 16 GB, Blue"),
+    ("Fire Kids Edition", "Fire Kids Edition Tablet, 7 Display, Wi-Fi, 16 GB, Green Kid-Proof Case"),
+    ("Fire TV Stick", "Amazon Fire TV Stick with Alexa Voice Remote"),
+    ("Echo Dot", "Echo Dot (2nd Generation) - Black"),
+    ("Echo Show", "Amazon Echo Show Alexa-enabled Bluetooth Speaker with 7\" Screen"),
+    ("Amazon Tap", "Amazon Tap - Alexa-Enabled Portable Bluetooth Speaker"),
+    ("AAA batteries", "AmazonBasics AAA Performance Alkaline Batteries (36 Count)"),
+    ("charger", "Amazon 9W PowerFast Official OEM USB Charger and Power Adapter"),
+]
+SHORT_NAMES = [short for short, _ in PRODUCTS]
+NAMES = [name for _, name in PRODUCTS]
+
+ASPECTS = [
+    "battery", "screen", "price", "sound", "setup", "wifi", "speed", "apps",
+    "charger", "remote", "voice control", "parental controls", "storage",
+    "weight", "backlight", "packaging",
+]
+
+POSITIVE = [
+    "The {a} is fantastic and works exactly as advertised.",
+    "Really happy with the {a}, far better than my old one.",
+    "Love the {a}; my whole family uses it every day.",
+    "Great value, the {a} alone is worth the money.",
+]
+NEUTRAL = [
+    "The {a} is okay but nothing special.",
+    "Decent {a}, though it took some getting used to.",
+    "Average {a} for the price, does the job.",
+]
+NEGATIVE = [
+    "The {a} stopped working after two weeks, very disappointed.",
+    "Terrible {a}, I returned it and want my money back.",
+    "Frustrating {a}, customer support could not help.",
+    "The {a} is slow and constantly freezes.",
+]
+FILLER = [
+    "Bought this as a gift for my mom.",
+    "Arrived quickly and well packaged.",
+    "Would recommend to anyone on a budget.",
+    "Second one I've owned.",
+    "Easy to read in bright sunlight.",
+    "My kids use it for games and books.",
+    "",
+]
+
+
+def generate_chunk(rows, seed=0, start=0):
+    """One DataFrame of ``rows`` synthetic reviews (deterministic per seed/start)."""
+    rng = np.random.default_rng([seed, start])
+    product = rng.integers(len(PRODUCTS), size=rows)
+    aspect = rng.integers(len(ASPECTS), size=rows)
+    rating = rng.choice([1, 2, 3, 4, 5], size=rows, p=[0.06, 0.05, 0.09, 0.25, 0.55])
+    template = rng.integers(12, size=rows)
+    filler = rng.integers(len(FILLER), size=rows)
+
+    texts = []
+    for i, (p, a, r, t, f) in enumerate(zip(product, aspect, rating, template, filler)):
+        pool = POSITIVE if r >= 4 else NEUTRAL if r == 3 else NEGATIVE
+        sentence = pool[t % len(pool)].format(a=ASPECTS[a])
+        # Mention the product family in some reviews, as real reviewers do
+        if t % 3 == 0:
+            sentence = f"{SHORT_NAMES[p]}: {sentence}"
+        texts.append(f"{sentence} {FILLER[f]} Ref {start + i}.".replace("  ", " "))
+
+    return pd.DataFrame({
+        "id": [f"SYN{start + i:09d}" for i in range(rows)],
+        "name": np.asarray(NAMES, dtype=object)[product],
+        "reviews.rating": rating,
+        "reviews.text": texts,
+    })
+
+
+def iter_chunks(rows, chunksize=100_000, seed=0):
+    for start in range(0, rows, chunksize):
+        yield generate_chunk(min(chunksize, rows - start), seed, start)
+
+
+def write_corpus(folder, rows, chunksize=100_000, seed=0, filename="synthetic_reviews.csv"):
+    """Write ``rows`` reviews to ``folder/filename``; returns the path."""
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, filename)
+    for i, chunk in enumerate(iter_chunks(rows, chunksize, seed)):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return path
+
+
+def sample_queries(n, seed=0):
+    """Natural-language queries about the synthetic catalogue."""
+    rng = np.random.default_rng(seed)
+    shapes = [
+        "What do customers think about the {a} of the {p}?",
+        "Biggest complaints about the {p} {a}",
+        "Is the {a} on the {p} any good?",
+        "How is the {a}?",
+    ]
+    return [
+        shapes[rng.integers(len(shapes))].format(
+            a=ASPECTS[rng.integers(len(ASPECTS))], p=SHORT_NAMES[rng.integers(len(SHORT_NAMES))]
+        )
+        for _ in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--out", default="bench_data")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    path = write_corpus(args.out, args.rows, seed=args.seed)
+    print(f"Wrote {args.rows:,} synthetic reviews to {path}")
+
+
+if __name__ == "__main__":
+    main()
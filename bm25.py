@@ -0,0 +1,165 @@
+"""Sparse BM25 inverted index over ``clean_text``, stored next to the vectorstore.
+
+The index is written as flat CSR-style ``.npy`` arrays (term -> postings) so
+query-time loading is a memory map, shared by every worker process, with no
+parse step. Document keys are the Chroma review IDs, so BM25 hits can be
+fused with vector hits directly.
+"""
+import os
+import re
+import json
+import math
+import time
+from array import array
+from collections import Counter
+
+import numpy as np
+
+BM25_DIR = os.path.join("vectorstore", "bm25")
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+class BM25Builder:
+    """Accumulates postings chunk by chunk during build_vectorstore."""
+
+    def __init__(self):
+        self.vocab = {}
+        self.postings = []  # term_id -> (array of doc ids, array of term freqs)
+        self.doc_keys = []
+        self.doc_len = array("i")
+        self.doc_name = array("i")
+        self.names = {}
+
+    def add(self, ids, texts, names):
+        for key, text, name in zip(ids, texts, names):
+            doc = len(self.doc_keys)
+            self.doc_keys.append(key)
+            tokens = tokenize(text) if isinstance(text, str) else []
+            self.doc_len.append(len(tokens))
+            name = name if isinstance(name, str) else ""
+            self.doc_name.append(self.names.setdefault(name, len(self.names)))
+            for term, tf in Counter(tokens).items():
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    term_id = self.vocab[term] = len(self.postings)
+                    self.postings.append((array("i"), array("i")))
+                docs, tfs = self.postings[term_id]
+                docs.append(doc)
+                tfs.append(tf)
+
+    def save(self, path=BM25_DIR):
+        os.makedirs(path, exist_ok=True)
+        indptr = np.zeros(len(self.postings) + 1, dtype=np.int64)
+        for i, (docs, _) in enumerate(self.postings):
+            indptr[i + 1] = indptr[i] + len(docs)
+        post_docs = np.empty(indptr[-1], dtype=np.int32)
+        post_tfs = np.empty(indptr[-1], dtype=np.float32)
+        for i, (docs, tfs) in enumerate(self.postings):
+            post_docs[indptr[i]:indptr[i + 1]] = docs
+            post_tfs[indptr[i]:indptr[i + 1]] = tfs
+
+        doc_len = np.frombuffer(self.doc_len, dtype=np.int32) if self.doc_len else np.zeros(0, np.int32)
+        np.save(os.path.join(path, "indptr.npy"), indptr)
+        np.save(os.path.join(path, "post_docs.npy"), post_docs)
+        np.save(os.path.join(path, "post_tfs.npy"), post_tfs)
+        np.save(os.path.join(path, "doc_len.npy"), doc_len)
+        np.save(os.path.join(path, "doc_name.npy"), np.asarray(self.doc_name, dtype=np.int32))
+        np.save(os.path.join(path, "doc_keys.npy"), np.asarray(self.doc_keys, dtype="S40"))
+
+        names = sorted(self.names, key=self.names.get)
+        meta = {
+            "vocab": self.vocab,
+            "names": names,
+            "n_docs": len(self.doc_keys),
+            "avgdl": float(doc_len.mean()) if len(doc_len) else 0.0,
+        }
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+
+class BM25Index:
+    """Memory-mapped BM25 index; see ``BM25Builder`` for the on-disk layout."""
+
+    def __init__(self, path=BM25_DIR, k1=1.5, b=0.75):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.vocab = meta["vocab"]
+        self.names = meta["names"]
+        self.n_docs = meta["n_docs"]
+        self.avgdl = meta["avgdl"] or 1.0
+        self.k1 = k1
+        self.b = b
+
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        self.indptr = load("indptr.npy")
+        self.post_docs = load("post_docs.npy")
+        self.post_tfs = load("post_tfs.npy")
+        self.doc_len = load("doc_len.npy")
+        self.doc_name = load("doc_name.npy")
+        self.doc_keys = load("doc_keys.npy")
+
+    @classmethod
+    def load(cls, path=BM25_DIR):
+        """Open the index, or return None if the build hasn't written one."""
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        return cls(path)
+
+    def search(self, query, top_k=10, names=None, budget_ms=None):
+        """Return ``[(review_id, score), ...]`` best first.
+
+        ``names`` restricts hits to those catalogue names. Terms are scored
+        rarest first; once ``budget_ms`` is spent the remaining (most common,
+        least informative) terms are skipped.
+        """
+        t0 = time.perf_counter()
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        term_ids = sorted(term_ids, key=lambda t: self.indptr[t + 1] - self.indptr[t])
+
+        doc_parts, score_parts = [], []
+        for term_id in term_ids:
+            if budget_ms is not None and doc_parts and (time.perf_counter() - t0) * 1000 > budget_ms:
+                break
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = np.asarray(self.post_docs[start:end])
+            tfs = np.asarray(self.post_tfs[start:end])
+            df = end - start
+            idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+            doc_parts.append(docs)
+            score_parts.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+
+        if not doc_parts:
+            return []
+
+        docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+        if names is not None:
+            wanted = set(names)
+            allowed = [i for i, n in enumerate(self.names) if n in wanted]
+            mask = np.isin(self.doc_name[docs], allowed)
+            docs, scores = docs[mask], scores[mask]
+
+        if len(docs) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            best = np.arange(len(docs))
+        best = best[np.argsort(-scores[best])]
+        return [(self.doc_keys[docs[i]].decode("ascii"), float(scores[i])) for i in best]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse several ranked ID lists; returns IDs ordered by RRF score."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -1,11 +1,30 @@
 import os
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-from preprocess import load_and_preprocess
+import json
+import hashlib
+import argparse
+import time
+import queue
+import sqlite3
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from preprocess import iter_raw_chunks, clean_chunk
+from product_index import ProductIndex, PRODUCT_INDEX_FILE
+from aggregates import ProductAggregates, AGGREGATES_FILE
+from bm25 import BM25Builder, BM25_DIR
+from dedup import Deduplicator, load_dup_counts, save_dup_counts
+from encode_pool import EncodePool
+from embedding_cache import EmbeddingCache
+from resources import write_generation, VECTOR_BACKEND
+from vector_store import LOCAL_STORE_DIR, export_collection
 
 VECTOR_PATH = "vectorstore"
 COLLECTION_NAME = "reviews"
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+CHECKPOINT_FILE = os.path.join(VECTOR_PATH, "build_checkpoint.json")
+# dup_count (> 1 only) of every batch an unfinished build upserted, one JSON object per line
+CHECKPOINT_COUNTS_FILE = os.path.join(VECTOR_PATH, "build_checkpoint_counts.jsonl")
+BATCH_SIZE = 5000
 
 
 def chunks(lst, n):
@@ -14,52 +33,426 @@ def chunks(lst, n):
         yield lst[i:i + n]
 
 
-def build_vectorstore():
-    os.makedirs(VECTOR_PATH, exist_ok=True)
+def review_id(name, text, rating) -> str:
+    """Stable content-hash ID for a review (independent of row position)."""
+    key = f"{name}\x1f{text}\x1f{rating}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class IdSet:
+    """Set of review IDs kept in a SQLite table instead of Python memory.
+
+    Several sets can share one connection; the default is a private on-disk
+    temp database that SQLite deletes when it is closed.
+    """
+
+    def __init__(self, name, conn=None):
+        self.name = name
+        self.conn = conn or sqlite3.connect("")
+        self.conn.execute(f"CREATE TABLE {name} (id TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    def update(self, ids):
+        self.conn.executemany(f"INSERT OR IGNORE INTO {self.name} VALUES (?)", ((i,) for i in ids))
+
+    def contains(self, ids):
+        """Membership flag per ID, in order."""
+        ids = list(ids)
+        found = set()
+        for id_batch in chunks(ids, 500):
+            marks = ",".join("?" * len(id_batch))
+            rows = self.conn.execute(f"SELECT id FROM {self.name} WHERE id IN ({marks})", id_batch)
+            found.update(r[0] for r in rows)
+        return [i in found for i in ids]
+
+    def difference(self, other):
+        """Iterate IDs in this set but not in ``other`` (same connection), sorted."""
+        return (r[0] for r in self.conn.execute(
+            f"SELECT id FROM {self.name} a WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {other.name} b WHERE b.id = a.id) ORDER BY id"
+        ))
+
+    def __len__(self):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+
+
+def existing_ids(collection, ids, page_size=BATCH_SIZE):
+    """Add every ID already stored in the collection to ``ids``, page by page."""
+    offset = 0
+    while True:
+        page = collection.get(include=[], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.update(page["ids"])
+        offset += len(page["ids"])
+    return ids
+
+
+def batched(iterable, n):
+    """Yield lists of up to n items from any iterable."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_checkpoint():
+    if not os.path.exists(CHECKPOINT_FILE):
+        return None
+    with open(CHECKPOINT_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_checkpoint_counts():
+    """dup_count of rows an interrupted build upserted, as stored in the collection."""
+    counts = {}
+    if os.path.exists(CHECKPOINT_COUNTS_FILE):
+        with open(CHECKPOINT_COUNTS_FILE, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    counts.update(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # torn last line from the crash
+    return counts
+
+
+def append_checkpoint_counts(counts):
+    with open(CHECKPOINT_COUNTS_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(counts) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def save_checkpoint(state):
+    tmp = CHECKPOINT_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, CHECKPOINT_FILE)
+
+
+class StageStats:
+    """Accumulates rows processed and wall time per pipeline stage."""
+
+    def __init__(self):
+        self.rows = {}
+        self.seconds = {}
+
+    def record(self, stage, rows, seconds):
+        self.rows[stage] = self.rows.get(stage, 0) + rows
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def report(self):
+        print("\n=== Throughput per stage ===")
+        for stage, rows in self.rows.items():
+            secs = self.seconds[stage]
+            rate = rows / secs if secs > 0 else float("inf")
+            print(f"{stage:>8}: {rows} rows in {secs:.1f}s ({rate:,.0f} rows/sec)")
+
+
+class UpsertWriter:
+    """Upserts embedded batches on a background thread.
+
+    Encoding the next chunk overlaps with the DB write of this one; the
+    bounded queue keeps at most ``depth`` batches of embeddings in memory.
+    """
 
-    print("\n=== STEP 1: Loading and preprocessing ALL CSV files ===")
-    df = load_and_preprocess()
+    def __init__(self, collection, stats, depth=2):
+        self.collection = collection
+        self.stats = stats
+        self.queue = queue.Queue(maxsize=depth)
+        self.written = 0
+        self.error = None
+        self.aborted = False
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="upsert-writer", daemon=True)
+        self.thread.start()
 
-    print("\n=== STEP 2: Embedding review text using MiniLM ===")
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    embeddings = model.encode(df["clean_text"].tolist(), show_progress_bar=True)
+    def put(self, ids, documents, metadatas, embeddings):
+        if self.error:
+            raise self.error
+        self.queue.put((ids, documents, metadatas, embeddings))
 
-    print("\n=== STEP 3: Creating ChromaDB vectorstore ===")
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                return
+            if self.error or self.aborted:
+                continue  # drain so the producer never blocks
+            ids, documents, metadatas, embeddings = batch
+            try:
+                # Recorded before the upsert, so a crash can't leave rows with unknown counts
+                counts = {i: int(m["dup_count"]) for i, m in zip(ids, metadatas) if m["dup_count"] > 1}
+                if counts:
+                    append_checkpoint_counts(counts)
+                t0 = time.perf_counter()
+                self.collection.upsert(
+                    ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings.tolist()
+                )
+                self.stats.record("upsert", len(ids), time.perf_counter() - t0)
+                self.written += len(ids)
+                save_checkpoint({"status": "in_progress", "written": self.written})
+                print(f"Upserted {self.written} new/changed reviews so far...")
+            except Exception as e:
+                self.error = e
+
+    def close(self, abort=False):
+        """Flush queued batches and stop; ``abort=True`` drops them and never raises."""
+        if not self.closed:
+            self.closed = True
+            self.aborted = abort
+            self.queue.put(None)
+            self.thread.join()
+        if self.error and not abort:
+            raise self.error
+        return self.written
+
+
+def report_dedup(dedup_stats, stats):
+    skipped = dedup_stats["exact_duplicates"] + dedup_stats["near_duplicates"]
+    print("\n=== Deduplication ===")
+    print(f"Reviews read: {dedup_stats['reviews']} | kept: {dedup_stats['kept']} | "
+          f"exact dups: {dedup_stats['exact_duplicates']} | near dups: {dedup_stats['near_duplicates']} "
+          f"({dedup_stats['duplicate_rate']:.1%})")
+    encoded, secs = stats.rows.get("encode", 0), stats.seconds.get("encode", 0.0)
+    if encoded:
+        print(f"Embedding work skipped: {skipped} reviews (~{skipped * secs / encoded:.1f}s of encoding)")
+    else:
+        print(f"Embedding work skipped: {skipped} reviews")
+
+
+def update_dup_counts(collection, final, current):
+    """Rewrite ``dup_count`` metadata wherever the stored value is out of date.
+
+    ``final`` and ``current`` map review IDs to their copy count after this
+    build and as currently stored; missing IDs count as 1.
+    """
+    changed = sorted(i for i in set(final) | set(current) if final.get(i, 1) != current.get(i, 1))
+    for id_batch in chunks(changed, BATCH_SIZE):
+        got = collection.get(ids=id_batch, include=["metadatas"])
+        metadatas = [dict(m or {}, dup_count=final.get(i, 1)) for i, m in zip(got["ids"], got["metadatas"])]
+        if got["ids"]:
+            collection.update(ids=got["ids"], metadatas=metadatas)
+    return len(changed)
+
+
+def build_vectorstore(full=False, data_folder="data", chunksize=BATCH_SIZE, near_dedup=True,
+                      export_local=VECTOR_BACKEND == "local", local_dtype="int8", nlist=0,
+                      encode_workers=0, encode_batch_size=64, embed_cache=True):
+    # Imported here: spawned worker processes re-import this module, and
+    # shouldn't each load chromadb and torch
+    import chromadb
+    from chromadb.config import Settings
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(VECTOR_PATH, exist_ok=True)
+
+    print("\n=== STEP 1: Opening ChromaDB vectorstore ===")
     client = chromadb.PersistentClient(
         path=VECTOR_PATH,
         settings=Settings(allow_reset=True)
     )
-    client.reset()
+    if full:
+        print("Full rebuild requested: resetting vectorstore.")
+        client.reset()
 
     collection = client.get_or_create_collection(COLLECTION_NAME)
 
-    print("\n=== STEP 4: Adding documents in safe batches ===")
-
-    batch_size = 5000
-    ids = [str(i) for i in df.index]
-    docs = df["clean_text"].tolist()
-    metas = df[["name", "reviews.rating"]].to_dict(orient="records")
-    embeds = embeddings.tolist()
-
-    for i, (id_batch, doc_batch, meta_batch, embed_batch) in enumerate(
-        zip(
-            chunks(ids, batch_size),
-            chunks(docs, batch_size),
-            chunks(metas, batch_size),
-            chunks(embeds, batch_size),
-        )
-    ):
-        print(f"Adding batch {i + 1}...")
-        collection.add(
-            ids=id_batch,
-            documents=doc_batch,
-            metadatas=meta_batch,
-            embeddings=embed_batch,
-        )
+    checkpoint = load_checkpoint()
+    resumed_counts = {}
+    if not full and checkpoint and checkpoint.get("status") == "in_progress":
+        # Cleaning and dedup re-run over every CSV; only rows already stored skip embedding
+        print(f"Resuming interrupted build ({checkpoint['written']} rows already written).")
+        resumed_counts = load_checkpoint_counts()
+    elif os.path.exists(CHECKPOINT_COUNTS_FILE):
+        os.remove(CHECKPOINT_COUNTS_FILE)
+
+    # ID sets live in SQLite so memory stays flat however large the store is
+    stored = existing_ids(collection, IdSet("stored"))
+    seen = IdSet("seen", stored.conn)
+    print(f"Stored reviews: {len(stored)}")
+
+    print("\n=== STEP 2: Streaming CSV chunks → clean → embed → upsert ===")
+    # Worker processes are spawned, not forked: this process has torch loaded
+    # and, once the writer starts, a running thread
+    clean_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+    encoder = vector_cache = writer = None
+    try:
+        if encode_workers:
+            # Worker processes each load the model; see encode_pool.py
+            encoder = EncodePool(EMBED_MODEL_NAME, workers=encode_workers, batch_size=encode_batch_size)
+            encode = encoder.encode
+        else:
+            model = SentenceTransformer(EMBED_MODEL_NAME)
+
+            def encode(docs):
+                # encode() sorts each call by length internally to limit padding
+                return model.encode(docs, batch_size=encode_batch_size, show_progress_bar=False)
+        # Texts embedded by any earlier build (even under another ID) are reused
+        vector_cache = EmbeddingCache(EMBED_MODEL_NAME) if embed_cache else None
+        stats = StageStats()
+        product_names = set()
+        aggregates = ProductAggregates()
+        bm25 = BM25Builder()
+        dedup = Deduplicator(near_dup=near_dedup, conn=stored.conn)
+        written_counts = {}
+        save_checkpoint({"status": "in_progress", "written": 0})
+        writer = UpsertWriter(collection, stats)
+
+        # Only the chunk being encoded plus the writer's queued batches are alive
+        # at a time, so peak memory stays flat regardless of corpus size.
+        failed = []
+        chunk_iter = iter_raw_chunks(data_folder, chunksize, failed=failed)
+        while True:
+            t0 = time.perf_counter()
+            chunk = next(chunk_iter, None)
+            if chunk is None:
+                break
+            stats.record("read", len(chunk), time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            chunk = clean_chunk(chunk, executor=clean_pool)
+            stats.record("clean", len(chunk), time.perf_counter() - t0)
+
+            chunk["id"] = [
+                review_id(n, t, r)
+                for n, t, r in zip(chunk["name"], chunk["clean_text"], chunk["reviews.rating"])
+            ]
+            product_names.update(chunk["name"].dropna())
+            # Every copy counts toward rating stats; only one copy is embedded
+            aggregates.add_chunk(chunk)
+
+            t0 = time.perf_counter()
+            rows = len(chunk)
+            groups = zip(chunk["name"], chunk["reviews.rating"])
+            chunk = chunk[dedup.add(chunk["id"], chunk["clean_text"], groups)]
+            stats.record("dedup", rows, time.perf_counter() - t0)
+            seen.update(chunk["id"])
+            bm25.add(chunk["id"], chunk["clean_text"], chunk["name"])
+
+            pending = chunk[[not s for s in stored.contains(chunk["id"])]]
+            if pending.empty:
+                continue
+
+            docs = pending["clean_text"].tolist()
+            # Copies found so far; later chunks can add more (fixed up in STEP 3)
+            pending = pending.assign(dup_count=[dedup.dup_count.get(i, 1) for i in pending["id"]])
+            # Count 1 is the default, so only real duplicates need remembering
+            written_counts.update((i, c) for i, c in zip(pending["id"], pending["dup_count"]) if c > 1)
+            t0 = time.perf_counter()
+            embeddings = vector_cache.encode(docs, encode) if vector_cache else encode(docs)
+            stats.record("encode", len(docs), time.perf_counter() - t0)
+
+            writer.put(
+                pending["id"].tolist(),
+                docs,
+                pending[["name", "reviews.rating", "source", "dup_count"]].to_dict(orient="records"),
+                embeddings,
+            )
+
+
+        clean_pool.shutdown()
+        written = writer.close()
+        if encoder is not None:
+            encoder.close()
+        if vector_cache is not None:
+            vector_cache.close()
+
+        print("\n=== STEP 3: Removing stale reviews and updating duplicate counts ===")
+        # Rows whose source file vanished (or whose content changed, or that are
+        # now duplicates of another review) are stale. A file that failed to read
+        # never reached `seen`, so its rows would look stale too: keep them all.
+        stale = 0
+        if failed:
+            print(f"WARNING: {len(failed)} file(s) failed to read; skipping stale deletion: {failed}")
+        else:
+            for id_batch in batched(stored.difference(seen), BATCH_SIZE):
+                collection.delete(ids=id_batch)
+                stale += len(id_batch)
+        # Stored dup_count: as upserted this run or by the interrupted run it
+        # resumes, otherwise as of the previous build. Rows written this run
+        # were not stored before, so their old counts don't apply.
+        current, kept = {}, {}
+        if not full:
+            previous = {**load_dup_counts(), **resumed_counts}
+            ids = list(previous)
+            for i, s, n in zip(ids, stored.contains(ids), seen.contains(ids)):
+                if s and n:
+                    current[i] = previous[i]
+                elif s and failed:
+                    kept[i] = previous[i]  # row from an unread file, left as it was
+        current.update(written_counts)
+        recounted = update_dup_counts(collection, dedup.dup_count, current)
+        save_dup_counts({**kept, **dedup.dup_count})
+        if os.path.exists(CHECKPOINT_COUNTS_FILE):
+            os.remove(CHECKPOINT_COUNTS_FILE)
+    finally:
+        # Also on errors: otherwise worker processes and the writer keep the build alive
+        if writer is not None:
+            writer.close(abort=True)
+        clean_pool.shutdown(cancel_futures=True)
+        if encoder is not None:
+            encoder.close()
+        if vector_cache is not None:
+            vector_cache.close()
+        stored.conn.close()
+    print(f"New/changed: {written} | Stale deleted: {stale} | dup_count updated: {recounted}")
+
+    print("\n=== STEP 4: Writing product-name index, aggregates and BM25 index ===")
+    ProductIndex(product_names).save(PRODUCT_INDEX_FILE)
+    aggregates.save(AGGREGATES_FILE)
+    bm25.save(BM25_DIR)
+    print(f"Indexed {len(product_names)} distinct product names.")
+
+    changed = written or stale or recounted
+    if export_local and (changed or not os.path.exists(os.path.join(LOCAL_STORE_DIR, "meta.json"))):
+        print(f"\n=== STEP 5: Exporting local {local_dtype} vector store"
+              f"{f' ({nlist} IVF lists)' if nlist else ''} ===")
+        t0 = time.perf_counter()
+        meta = export_collection(collection, LOCAL_STORE_DIR, dtype=local_dtype, nlist=nlist)
+        stats.record("export", meta["count"], time.perf_counter() - t0)
+        changed = True
+
+    if changed:
+        # Tell retrievers that cached query results are now stale
+        write_generation()
+
+    dedup_stats = dedup.stats()
+    save_checkpoint({"status": "complete", "written": written, "dedup": dedup_stats})
+    stats.report()
+    if encoder is not None:
+        encoder.report()
+    if vector_cache is not None:
+        c = vector_cache.stats()
+        print(f"\nEmbedding cache: {c['hits']} hits / {c['misses']} encoded ({c['hit_rate']:.1%}), "
+              f"{c['entries']} entries")
+    report_dedup(dedup_stats, stats)
 
     print("\n✅ Vectorstore successfully built!")
     print("Stored in:", VECTOR_PATH)
 
 
 if __name__ == "__main__":
-    build_vectorstore()
+    parser = argparse.ArgumentParser(description="Build the ChromaDB review vectorstore.")
+    parser.add_argument("--full", action="store_true",
+                        help="Reset the store and re-embed every review.")
+    parser.add_argument("--no-near-dedup", action="store_true",
+                        help="Only drop exact duplicates (skips the MinHash pass).")
+    parser.add_argument("--export-local", action="store_true", default=VECTOR_BACKEND == "local",
+                        help="Also write the memory-mapped local vector store (VECTOR_BACKEND=local).")
+    parser.add_argument("--local-dtype", choices=["int8", "float16", "float32"], default="int8")
+    parser.add_argument("--nlist", type=int, default=0,
+                        help="IVF lists for the local store (0 = exact search).")
+    parser.add_argument("--encode-workers", type=int, default=0,
+                        help="Encode in N worker processes (0 = in this process).")
+    parser.add_argument("--encode-batch-size", type=int, default=64)
+    parser.add_argument("--no-embed-cache", action="store_true",
+                        help="Encode every pending review instead of reusing cached vectors.")
+    args = parser.parse_args()
+    build_vectorstore(full=args.full, near_dedup=not args.no_near_dedup,
+                      export_local=args.export_local, local_dtype=args.local_dtype, nlist=args.nlist,
+                      encode_workers=args.encode_workers, encode_batch_size=args.encode_batch_size,
+                      embed_cache=not args.no_embed_cache)
@@ -6,5 +6,37 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
+# LLM client resilience: base URL override (e.g. a local fake server), per-request
+# timeout, retries with jittered backoff, in-flight cap and circuit breaker
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+# LLM response cache (set LLM_CACHE_ENABLED=0 to bypass)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# USD per 1M tokens, used to cost LLM calls in traces (defaults: gpt-4o-mini)
+LLM_PRICE_INPUT_PER_1M = float(os.getenv("LLM_PRICE_INPUT_PER_1M", "0.15"))
+LLM_PRICE_OUTPUT_PER_1M = float(os.getenv("LLM_PRICE_OUTPUT_PER_1M", "0.60"))
+
+# Retrieval reranking: "mmr" (diversify an over-fetched candidate pool),
+# "cross" (MMR, then a CPU cross-encoder) or "off"; BUDGET_MS caps the
+# time spent per query before falling back to first-stage order
+RERANK_MODE = os.getenv("RERANK_MODE", "mmr")
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "100"))
+RERANK_LAMBDA = float(os.getenv("RERANK_LAMBDA", "0.7"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "50"))
+
+# Tracing: append one JSON line per query here (unset to disable); serve
+# Prometheus metrics on this port (unset to disable)
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) or None
+
 if OPENAI_API_KEY is None:
     raise ValueError("Missing OPENAI_API_KEY in .env file")
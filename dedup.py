@@ -0,0 +1,199 @@
+"""Build-time review deduplication: exact ``clean_text`` hash + MinHash/LSH.
+
+The Datafiniti exports overlap, so the same review shows up in several
+CSVs. ``Deduplicator`` keeps the first copy of each review as its group's
+representative and counts the rest in ``dup_count``; only representatives
+are embedded and stored. Copies are only merged within one (product,
+rating) group, so "great product" under two products stays two reviews.
+
+Near-duplicates (same review with small edits) are found with MinHash over
+word shingles, banded LSH for candidates, and a b-bit signature check of
+the estimated Jaccard similarity. Only the low 8 bits of each MinHash value
+are kept.
+
+Seen IDs, signatures and LSH buckets live in SQLite (the build's temp
+database, or a private one), looked up once per chunk, so build memory
+does not grow with the corpus.
+"""
+import os
+import json
+import zlib
+import sqlite3
+
+import numpy as np
+
+DUP_COUNTS_FILE = os.path.join("vectorstore", "dup_counts.json")
+
+_PRIME = np.uint64((1 << 61) - 1)
+
+
+def _shingles(text, size):
+    words = text.split()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _select_in(conn, query, keys, size=500):
+    """Run ``query`` over ``keys`` in batches; ``{marks}`` is the IN placeholder list."""
+    keys = list(keys)
+    for i in range(0, len(keys), size):
+        batch = keys[i:i + size]
+        yield from conn.execute(query.format(marks=",".join("?" * len(batch))), batch)
+
+
+def _group_key(group):
+    # NaN != NaN (and hashes by identity), so raw NaN ratings would never match
+    return tuple("" if v != v else str(v) for v in group)
+
+
+class Deduplicator:
+    def __init__(self, near_dup=True, threshold=0.85, num_perm=64, bands=8,
+                 shingle_size=3, min_tokens=8, seed=1, conn=None):
+        self.near_dup = near_dup
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+        # Short reviews ("great product") share most shingles by chance; exact-only
+        self.min_tokens = min_tokens
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+
+        self.conn = conn or sqlite3.connect("")
+        self.conn.executescript(
+            """
+            -- review id (hash of name, text, rating) -> representative id
+            CREATE TABLE dedup_exact (id TEXT PRIMARY KEY, rep TEXT NOT NULL) WITHOUT ROWID;
+            -- representative ordinal -> id and low-byte MinHash signature
+            CREATE TABLE dedup_reps (ordinal INTEGER PRIMARY KEY, id TEXT NOT NULL, sig BLOB NOT NULL);
+            -- hash(group, band, band values) -> representative ordinal
+            CREATE TABLE dedup_buckets (key INTEGER PRIMARY KEY, ordinal INTEGER NOT NULL);
+            """
+        )
+        self._reps = 0
+        self.dup_count = {}    # representative id -> copies incl. itself (only if > 1)
+        self.exact_dups = 0
+        self.near_dups = 0
+        self.kept = 0
+
+    def _minhash(self, text):
+        shingles = _shingles(text, self.shingle_size)
+        x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                        dtype=np.uint64, count=len(shingles))
+        return ((self._a * x + self._b) % _PRIME).min(axis=1)
+
+    def _band_keys(self, sig, group):
+        # Hashed band keys keep the bucket table to one integer per entry
+        return [
+            hash((group, band, sig[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes()))
+            for band in range(self.bands)
+        ]
+
+    def _near_match(self, sig, keys, buckets, reps):
+        for key in keys:
+            ordinal = buckets.get(key)
+            if ordinal is None:
+                continue
+            rep_id, rep_sig = reps[ordinal]
+            # b-bit estimate: P(low bits equal) = J + (1 - J) / 256
+            agree = np.count_nonzero(rep_sig == sig.astype(np.uint8)) / self.num_perm
+            if (agree - 1 / 256) / (1 - 1 / 256) >= self.threshold:
+                return rep_id
+        return None
+
+    def _count(self, rep_id):
+        self.dup_count[rep_id] = self.dup_count.get(rep_id, 1) + 1
+
+    def add(self, ids, texts, groups):
+        """Return a keep-mask for one chunk; duplicates are counted on their representative.
+
+        ``ids`` must already key on product, rating and text (``review_id``);
+        ``groups`` are the matching (product, rating) pairs that bound
+        near-duplicate matching.
+        """
+        ids = list(ids)
+        texts = [t if isinstance(t, str) else "" for t in texts]
+        groups = [_group_key(g) for g in groups]
+        exact = dict(_select_in(self.conn, "SELECT id, rep FROM dedup_exact WHERE id IN ({marks})", ids))
+
+        # Signatures, buckets and candidate representatives for the whole chunk
+        sigs, keys = {}, {}
+        if self.near_dup:
+            for j, (review_id, text) in enumerate(zip(ids, texts)):
+                if review_id not in exact and len(text.split()) >= self.min_tokens:
+                    sigs[j] = self._minhash(text)
+                    keys[j] = self._band_keys(sigs[j], groups[j])
+        buckets = dict(_select_in(
+            self.conn, "SELECT key, ordinal FROM dedup_buckets WHERE key IN ({marks})",
+            {k for row_keys in keys.values() for k in row_keys},
+        ))
+        reps = {
+            ordinal: (rep_id, np.frombuffer(sig, dtype=np.uint8))
+            for ordinal, rep_id, sig in _select_in(
+                self.conn, "SELECT ordinal, id, sig FROM dedup_reps WHERE ordinal IN ({marks})",
+                set(buckets.values()),
+            )
+        }
+
+        keep, new_exact, new_reps, new_buckets = [], [], [], {}
+        for j, review_id in enumerate(ids):
+            rep = exact.get(review_id)
+            if rep is not None:
+                self._count(rep)
+                self.exact_dups += 1
+                keep.append(False)
+                continue
+
+            if j in sigs:
+                rep = self._near_match(sigs[j], keys[j], buckets, reps)
+                if rep is not None:
+                    exact[review_id] = rep
+                    new_exact.append((review_id, rep))
+                    self._count(rep)
+                    self.near_dups += 1
+                    keep.append(False)
+                    continue
+                ordinal = self._reps
+                self._reps += 1
+                low = sigs[j].astype(np.uint8)
+                reps[ordinal] = (review_id, low)
+                new_reps.append((ordinal, review_id, low.tobytes()))
+                for key in keys[j]:
+                    if key not in buckets:
+                        buckets[key] = new_buckets[key] = ordinal
+
+            exact[review_id] = review_id
+            new_exact.append((review_id, review_id))
+            self.kept += 1
+            keep.append(True)
+
+        self.conn.executemany("INSERT INTO dedup_exact VALUES (?, ?)", new_exact)
+        self.conn.executemany("INSERT INTO dedup_reps VALUES (?, ?, ?)", new_reps)
+        self.conn.executemany("INSERT INTO dedup_buckets VALUES (?, ?)", new_buckets.items())
+        self.conn.commit()
+        return keep
+
+    def stats(self):
+        seen = self.kept + self.exact_dups + self.near_dups
+        return {
+            "reviews": seen,
+            "kept": self.kept,
+            "exact_duplicates": self.exact_dups,
+            "near_duplicates": self.near_dups,
+            "duplicate_rate": (seen - self.kept) / seen if seen else 0.0,
+        }
+
+
+def load_dup_counts(path=DUP_COUNTS_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_dup_counts(counts, path=DUP_COUNTS_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(counts, f)
+    os.replace(tmp, path)
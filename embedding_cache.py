@@ -0,0 +1,169 @@
+"""Persistent embedding cache: hash(model name, normalized text) -> vector.
+
+Rows are appended to two flat files per model under ``.cache/embeddings``:
+``keys.u64`` (8-byte blake2b content hashes) and ``vectors.bin`` (float16
+rows by default), read back through a memory map. Lookups are a vectorized
+``searchsorted`` over the sorted keys, so opening a cache with millions of
+rows costs one sort and no per-row Python objects.
+
+The build writes to it; ``RetrieverAgent`` opens it read-only, because
+several app processes appending to the same files would interleave rows,
+and re-opens it when the build writes a new generation.
+"""
+import os
+import re
+import json
+import hashlib
+import unicodedata
+
+import numpy as np
+
+EMBED_CACHE_DIR = os.path.join(".cache", "embeddings")
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFC", str(text))).strip()
+
+
+def content_key(model_name, text):
+    digest = hashlib.blake2b(f"{model_name}\x1f{normalize_text(text)}".encode("utf-8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "little")
+
+
+class EmbeddingCache:
+    def __init__(self, model_name, path=EMBED_CACHE_DIR, dtype="float16", readonly=False):
+        self.model_name = model_name
+        self.path = os.path.join(path, re.sub(r"[^\w.-]+", "_", model_name))
+        self.readonly = readonly
+        self.hits = 0
+        self.misses = 0
+        self.dim = None
+        self.dtype = np.dtype(dtype)
+
+        meta_path = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dim, self.dtype = meta["dim"], np.dtype(meta["dtype"])
+        self._load()
+        self._keys_file = self._vectors_file = None
+
+    @classmethod
+    def open_readonly(cls, model_name, path=EMBED_CACHE_DIR):
+        """Open an existing cache for lookups only, or return None if there is none."""
+        cache = cls(model_name, path, readonly=True)
+        return cache if cache.size else None
+
+    def _load(self):
+        keys_path = os.path.join(self.path, "keys.u64")
+        keys = np.fromfile(keys_path, dtype="<u8") if os.path.exists(keys_path) else np.zeros(0, "<u8")
+        vec_path = os.path.join(self.path, "vectors.bin")
+        row_bytes = (self.dim or 0) * self.dtype.itemsize
+        vec_bytes = os.path.getsize(vec_path) if os.path.exists(vec_path) else 0
+        rows = vec_bytes // row_bytes if row_bytes else 0
+        # An interrupted append can leave one file ahead of the other (or a
+        # partial row); the writer cuts both back so the next append lines
+        # keys up with vectors again
+        n = min(len(keys), rows)
+        if not self.readonly:
+            for path, size in ((keys_path, n * 8), (vec_path, n * row_bytes)):
+                if os.path.exists(path) and os.path.getsize(path) != size:
+                    with open(path, "r+b") as f:
+                        f.truncate(size)
+        self._order = np.argsort(keys[:n], kind="stable")
+        self._sorted = keys[:n][self._order]
+        self._vectors = np.memmap(vec_path, dtype=self.dtype, mode="r", shape=(n, self.dim)) if n else None
+        self.size = n
+        self._new = {}  # key -> row for rows appended since the last _load()
+
+    def _rows(self, keys):
+        """Row index per key, or -1 if not cached."""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if len(self._sorted):
+            pos = np.minimum(np.searchsorted(self._sorted, keys), len(self._sorted) - 1)
+            found = self._sorted[pos] == keys
+            rows[found] = self._order[pos[found]]
+        if self._new:
+            for j, k in enumerate(keys.tolist()):
+                if rows[j] < 0:
+                    rows[j] = self._new.get(k, -1)
+        return rows
+
+    def get_many(self, texts):
+        """Return ``(vectors, hit_mask)``; rows for misses are left as zeros."""
+        keys = np.fromiter((content_key(self.model_name, t) for t in texts), dtype="<u8", count=len(texts))
+        rows = self._rows(keys)
+        hit = rows >= 0
+        if hit.any() and rows[hit].max() >= self.size:
+            self._load()  # rows appended since the last memory map
+        out = np.zeros((len(texts), self.dim or 0), dtype=np.float32)
+        if hit.any():
+            out[hit] = self._vectors[rows[hit]]
+        self.hits += int(hit.sum())
+        self.misses += int((~hit).sum())
+        return out, hit
+
+    def put_many(self, texts, vectors):
+        if self.readonly:
+            raise RuntimeError("EmbeddingCache opened read-only")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dim": self.dim, "dtype": self.dtype.name}, f)
+        if self._keys_file is None:
+            self._keys_file = open(os.path.join(self.path, "keys.u64"), "ab")
+            self._vectors_file = open(os.path.join(self.path, "vectors.bin"), "ab")
+
+        keys = np.fromiter((content_key(self.model_name, t) for t in texts), dtype="<u8", count=len(texts))
+        # Vectors are durable before their keys are published: a crash between
+        # the writes leaves an orphan vector, which the next open truncates
+        self._vectors_file.write(vectors.astype(self.dtype).tobytes())
+        self._vectors_file.flush()
+        os.fsync(self._vectors_file.fileno())
+        self._keys_file.write(keys.tobytes())
+        self._keys_file.flush()
+        os.fsync(self._keys_file.fileno())
+        start = self.size + len(self._new)
+        for j, k in enumerate(keys.tolist()):
+            self._new[k] = start + j
+
+    def encode(self, texts, encode_fn):
+        """Vectors for ``texts``, calling ``encode_fn`` only for uncached ones."""
+        out, hit = self.get_many(texts)
+        missing = np.flatnonzero(~hit)
+        if len(missing):
+            # Repeated texts (same cache key) are encoded and stored once
+            slot, unique = {}, []
+            for i in missing:
+                key = normalize_text(texts[i])
+                if key not in slot:
+                    slot[key] = len(unique)
+                    unique.append(texts[i])
+            encoded = np.asarray(encode_fn(unique), dtype=np.float32)
+            if not self.readonly:
+                self.put_many(unique, encoded)
+            if out.shape[1] != encoded.shape[1]:  # empty cache: dim unknown until now
+                out = np.zeros((len(texts), encoded.shape[1]), dtype=np.float32)
+            out[missing] = encoded[[slot[normalize_text(texts[i])] for i in missing]]
+        return out
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": self.size + len(self._new),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        for f in (self._keys_file, self._vectors_file):
+            if f is not None:
+                f.close()
+        self._keys_file = self._vectors_file = None
@@ -0,0 +1,78 @@
+"""Multi-process sentence encoding for CPU-only build hosts.
+
+Like SentenceTransformer's ``start_multi_process_pool``: each worker
+process loads the model once and encodes a slice of every batch. Texts are
+sorted by length before being sliced, so each worker pads against similar
+lengths, and results are put back in input order. Torch threads are split
+between workers so they don't oversubscribe the cores. Workers are spawned,
+not forked, since the parent has torch loaded and runs other threads.
+"""
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+_model = None
+
+
+def _init_worker(model_name, threads):
+    global _model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_slice(texts, batch_size):
+    t0 = time.perf_counter()
+    emb = _model.encode(texts, batch_size=batch_size, show_progress_bar=False,
+                        convert_to_numpy=True)
+    return os.getpid(), len(texts), time.perf_counter() - t0, emb.astype(np.float32)
+
+
+def length_order(texts):
+    """Indices that sort ``texts`` by length (longest first, like encode())."""
+    return np.argsort([-len(t) for t in texts], kind="stable")
+
+
+class EncodePool:
+    def __init__(self, model_name, workers=None, batch_size=64):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(model_name, threads),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self.per_worker = {}  # pid -> [rows, seconds]
+
+    def encode(self, texts):
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        order = length_order(texts)
+        ordered = [texts[i] for i in order]
+        # Contiguous slices of the sorted list: similar lengths within each worker
+        step = -(-len(ordered) // self.workers)
+        slices = [ordered[i:i + step] for i in range(0, len(ordered), step)]
+        parts = []
+        for pid, rows, secs, emb in self.pool.map(_encode_slice, slices, [self.batch_size] * len(slices)):
+            totals = self.per_worker.setdefault(pid, [0, 0.0])
+            totals[0] += rows
+            totals[1] += secs
+            parts.append(emb)
+        encoded = np.concatenate(parts)
+        out = np.empty_like(encoded)
+        out[order] = encoded
+        return out
+
+    def report(self):
+        print("\n=== Encode throughput per worker ===")
+        for pid, (rows, secs) in sorted(self.per_worker.items()):
+            rate = rows / secs if secs > 0 else float("inf")
+            print(f"worker {pid}: {rows} rows in {secs:.1f}s ({rate:,.0f} rows/sec)")
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
@@ -1,13 +1,20 @@
+import os
 import json
-from rouge_score import rouge_scorer
-from bert_score import score as bertscore
-from orchestrator import ReviewInsightOrchestrator
-from memory import ShortTermMemory
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# Not imported from config: it demands OPENAI_API_KEY, which cached,
+# metric-only runs don't need
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
 
 # ===============================
 # Evaluation Set
 # ===============================
+# Fallback when no eval file is given; larger sets live in JSON/JSONL files
+# with "question" and "reference" fields.
 EVAL_SET = [
     {
         "question": "What do customers like most about the Kindle?",
@@ -27,67 +34,175 @@ EVAL_SET = [
     }
 ]
 
+PREDICTIONS_CACHE = os.path.join("evaluation", "predictions_cache.json")
+
+
+def load_eval_set(path=None):
+    """Load ``[{"question", "reference"}, ...]`` from a JSON or JSONL file."""
+    if not path:
+        return list(EVAL_SET)
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            items = [json.loads(line) for line in f if line.strip()]
+        else:
+            items = json.load(f)
+    return [{"question": i["question"], "reference": i["reference"]} for i in items]
+
+
+# ===============================
+# Predictions
+# ===============================
+
+def _cache_key(question):
+    return f"{OPENAI_MODEL}::{question}"
+
+
+def load_prediction_cache(path=PREDICTIONS_CACHE):
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_prediction_cache(cache, path=PREDICTIONS_CACHE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+
+
+def generate_predictions(questions, cache_path=PREDICTIONS_CACHE, concurrency=8, refresh=False):
+    """Return one summary per question, running only uncached ones through the pipeline.
+
+    Uncached questions go through ``run_batch`` concurrently; with a warm
+    cache the orchestrator (and the LLM) is never touched.
+    """
+    cache = {} if refresh else load_prediction_cache(cache_path)
+    missing = list(dict.fromkeys(q for q in questions if _cache_key(q) not in cache))
+
+    if missing:
+        # Imported here so metric-only reruns don't load the models and vectorstore
+        from orchestrator import ReviewInsightOrchestrator
+
+        print(f"🤖 Generating {len(missing)} predictions ({len(questions) - len(missing)} cached)")
+        orchestrator = ReviewInsightOrchestrator()
+        outputs = orchestrator.run_batch(missing, concurrency=concurrency)
+        for question, output in zip(missing, outputs):
+            cache[_cache_key(question)] = (output.get("summary") or "").strip()
+        if cache_path:
+            save_prediction_cache(cache, cache_path)
+    else:
+        print(f"♻️ All {len(questions)} predictions served from cache")
+
+    return [cache[_cache_key(q)] for q in questions]
+
 
 # ===============================
 # Metrics
 # ===============================
 
+_rouge = None
+
+
+def _rouge_scorer():
+    global _rouge
+    if _rouge is None:
+        from rouge_score import rouge_scorer
+        _rouge = rouge_scorer.RougeScorer(["rouge1", "rougeL"], use_stemmer=True)
+    return _rouge
+
+
 def compute_rouge(pred: str, ref: str):
-    scorer = rouge_scorer.RougeScorer(["rouge1", "rougeL"], use_stemmer=True)
-    scores = scorer.score(ref, pred)
+    scores = _rouge_scorer().score(ref, pred)
     return {
         "rouge1": scores["rouge1"].fmeasure,
         "rougeL": scores["rougeL"].fmeasure,
     }
 
 
+def compute_bertscore_batch(preds, refs, batch_size=32):
+    """BERTScore for all pairs in one call, so the model is loaded once."""
+    if not preds:
+        return []
+    from bert_score import score as bertscore
+
+    P, R, F1 = bertscore(preds, refs, lang="en", batch_size=batch_size, verbose=False)
+    return [(float(p), float(r), float(f)) for p, r, f in zip(P, R, F1)]
+
+
 def compute_bertscore(pred: str, ref: str):
-    P, R, F1 = bertscore(
-        [pred],
-        [ref],
-        lang="en",
-        verbose=False
-    )
-    return float(P[0]), float(R[0]), float(F1[0])
+    return compute_bertscore_batch([pred], [ref])[0]
 
 
 # ===============================
 # Main Evaluation
 # ===============================
 
-def run_evaluation():
-    orchestrator = ReviewInsightOrchestrator()
-    memory = ShortTermMemory()
+def write_report(results, json_path="evaluation_results_combined.json",
+                 md_path="evaluation_report_combined.md"):
+    # Save JSON
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4, ensure_ascii=False)
 
-    results = []
+    # Save Markdown
+    with open(md_path, "w", encoding="utf-8") as f:
+        f.write("# 📊 Evaluation Report (ROUGE + BERTScore)\n\n")
+        f.write("This report compares ROUGE (lexical) and BERTScore (semantic) metrics.\n\n")
 
-    print("\n🚀 Running Evaluation: ROUGE + BERTScore\n")
+        if results:
+            f.write("## Averages\n")
+            for metric in ("rouge1", "rougeL", "bertscore_f1"):
+                mean = sum(r[metric] for r in results) / len(results)
+                f.write(f"- {metric}: `{mean:.4f}`\n")
+            f.write("\n---\n")
 
-    for item in EVAL_SET:
-        q = item["question"]
-        ref = item["reference"]
+        for r in results:
+            f.write(f"## ❓ {r['question']}\n")
+            f.write(f"**Reference:** {r['reference']}\n\n")
+            f.write(f"**Prediction:** {r['prediction']}\n\n")
+            f.write("### Scores\n")
+            f.write(f"- ROUGE-1: `{r['rouge1']:.4f}`\n")
+            f.write(f"- ROUGE-L: `{r['rougeL']:.4f}`\n")
+            f.write(f"- BERTScore Precision: `{r['bertscore_precision']:.4f}`\n")
+            f.write(f"- BERTScore Recall: `{r['bertscore_recall']:.4f}`\n")
+            f.write(f"- BERTScore F1: `{r['bertscore_f1']:.4f}`\n")
+            f.write("\n---\n")
 
-        print(f"📌 Question: {q}")
+    print("✅ Evaluation complete.")
+    print(f"📄 Saved: {json_path}")
+    print(f"📝 Saved: {md_path}")
+
+
+def run_evaluation(eval_path=None, cache_path=PREDICTIONS_CACHE, concurrency=8, refresh=False):
+    items = load_eval_set(eval_path)
 
-        # Run your full agent pipeline
-        output = orchestrator.run(q, memory)
-        pred = output.get("summary", "").strip()
+    print(f"\n🚀 Running Evaluation: ROUGE + BERTScore ({len(items)} questions)\n")
+
+    predictions = generate_predictions(
+        [item["question"] for item in items], cache_path, concurrency, refresh
+    )
 
+    scored = []
+    for item, pred in zip(items, predictions):
         if not pred:
-            print("⚠ No prediction generated. Skipping.\n")
+            print(f"⚠ No prediction generated for: {item['question']}. Skipping.")
             continue
+        scored.append((item, pred))
 
-        # ---- Compute Metrics ----
-        rouge_scores = compute_rouge(pred, ref)
-        bert_precision, bert_recall, bert_f1 = compute_bertscore(pred, ref)
+    # ---- Compute Metrics ----
+    bert = compute_bertscore_batch([p for _, p in scored], [i["reference"] for i, _ in scored])
 
+    results = []
+    for (item, pred), (bert_precision, bert_recall, bert_f1) in zip(scored, bert):
+        rouge_scores = compute_rouge(pred, item["reference"])
+
+        print(f"📌 Question: {item['question']}")
         print(f"   ✔ ROUGE-1:  {rouge_scores['rouge1']:.4f}")
         print(f"   ✔ ROUGE-L:  {rouge_scores['rougeL']:.4f}")
         print(f"   ✔ BERT F1:  {bert_f1:.4f}\n")
 
         results.append({
-            "question": q,
-            "reference": ref,
+            "question": item["question"],
+            "reference": item["reference"],
             "prediction": pred,
             "rouge1": rouge_scores["rouge1"],
             "rougeL": rouge_scores["rougeL"],
@@ -96,31 +211,15 @@ def run_evaluation():
             "bertscore_f1": bert_f1,
         })
 
-    # Save JSON
-    with open("evaluation_results_combined.json", "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=4, ensure_ascii=False)
-
-    # Save Markdown
-    with open("evaluation_report_combined.md", "w", encoding="utf-8") as f:
-        f.write("# 📊 Evaluation Report (ROUGE + BERTScore)\n\n")
-        f.write("This report compares ROUGE (lexical) and BERTScore (semantic) metrics.\n\n")
-
-        for r in results:
-            f.write(f"## ❓ {r['question']}\n")
-            f.write(f"**Reference:** {r['reference']}\n\n")
-            f.write(f"**Prediction:** {r['prediction']}\n\n")
-            f.write("### Scores\n")
-            f.write(f"- ROUGE-1: `{r['rouge1']:.4f}`\n")
-            f.write(f"- ROUGE-L: `{r['rougeL']:.4f}`\n")
-            f.write(f"- BERTScore Precision: `{r['bertscore_precision']:.4f}`\n")
-            f.write(f"- BERTScore Recall: `{r['bertscore_recall']:.4f}`\n")
-            f.write(f"- BERTScore F1: `{r['bertscore_f1']:.4f}`\n")
-            f.write("\n---\n")
-
-    print("✅ Evaluation complete.")
-    print("📄 Saved: evaluation_results_combined.json")
-    print("📝 Saved: evaluation_report_combined.md")
+    write_report(results)
+    return results
 
 
 if __name__ == "__main__":
-    run_evaluation()
+    parser = argparse.ArgumentParser(description="ROUGE + BERTScore evaluation")
+    parser.add_argument("--eval-set", help="JSON or JSONL file of {question, reference}")
+    parser.add_argument("--predictions", default=PREDICTIONS_CACHE, help="prediction cache file")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--refresh", action="store_true", help="regenerate all predictions")
+    args = parser.parse_args()
+    run_evaluation(args.eval_set, args.predictions, args.concurrency, args.refresh)
@@ -1,15 +1,191 @@
-from openai import OpenAI
-from config import OPENAI_API_KEY, OPENAI_MODEL
-
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-def chat_completion(system_prompt: str, user_prompt: str):
-    resp = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.2,
-    )
-    return resp.choices[0].message.content.strip()
+import time
+import asyncio
+import weakref
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_MODEL,
+    OPENAI_BASE_URL,
+    LLM_TIMEOUT,
+    LLM_MAX_RETRIES,
+    LLM_MAX_CONCURRENCY,
+    LLM_BREAKER_THRESHOLD,
+    LLM_BREAKER_RESET,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_PRICE_INPUT_PER_1M,
+    LLM_PRICE_OUTPUT_PER_1M,
+)
+from llm_cache import ResponseCache
+from llm_client import CircuitBreaker, ResilientCaller, build_client, build_async_client
+from tracing import span
+
+# Clients are created on first use so importing the agents doesn't load openai.
+# ``async_client`` is only set by set_client(); real async clients are built
+# per event loop, because an httpx pool can't be used from another loop and
+# app.py runs every query in a fresh asyncio.run().
+client = None
+async_client = None
+_loop_clients = weakref.WeakKeyDictionary()
+_CLIENT_OPTIONS = dict(
+    base_url=OPENAI_BASE_URL,
+    timeout=LLM_TIMEOUT,
+    max_connections=max(LLM_MAX_CONCURRENCY, 1) * 2,
+)
+
+response_cache = ResponseCache(
+    path=LLM_CACHE_PATH,
+    ttl=LLM_CACHE_TTL,
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    enabled=LLM_CACHE_ENABLED,
+)
+
+# Retries, backoff, in-flight cap and circuit breaker, shared by every caller
+caller = ResilientCaller(
+    max_retries=LLM_MAX_RETRIES,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    breaker=CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET),
+)
+
+
+def set_client(new_client=None, new_async_client=None):
+    """Swap the OpenAI clients, e.g. for local stand-ins during tests."""
+    global client, async_client
+    if new_client is not None:
+        client = new_client
+    if new_async_client is not None:
+        async_client = new_async_client
+
+
+def _client():
+    global client
+    if client is None:
+        client = build_client(OPENAI_API_KEY, **_CLIENT_OPTIONS)
+    return client
+
+
+def _async_client():
+    if async_client is not None:
+        return async_client
+    loop = asyncio.get_running_loop()
+    loop_client = _loop_clients.get(loop)
+    if loop_client is None:
+        loop_client = _loop_clients[loop] = build_async_client(OPENAI_API_KEY, **_CLIENT_OPTIONS)
+    return loop_client
+
+
+def run_async(coro):
+    """``asyncio.run(coro)``, closing the loop's OpenAI client before the loop ends."""
+    async def main():
+        try:
+            return await coro
+        finally:
+            loop_client = _loop_clients.pop(asyncio.get_running_loop(), None)
+            if loop_client is not None:
+                await loop_client.close()
+    return asyncio.run(main())
+
+
+def _messages(system_prompt, user_prompt):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def _record_usage(record, usage):
+    """Attach token counts and cost from an API ``usage`` object to a trace span."""
+    if usage is None:
+        return
+    record["prompt_tokens"] = usage.prompt_tokens
+    record["completion_tokens"] = usage.completion_tokens
+    record["cost_usd"] = (
+        usage.prompt_tokens * LLM_PRICE_INPUT_PER_1M
+        + usage.completion_tokens * LLM_PRICE_OUTPUT_PER_1M
+    ) / 1e6
+
+
+def chat_completion(system_prompt: str, user_prompt: str, temperature=0.2, use_cache=True):
+    with span("llm", model=OPENAI_MODEL) as record:
+        key = response_cache.make_key(OPENAI_MODEL, system_prompt, user_prompt, temperature)
+        if use_cache:
+            cached = response_cache.get(key)
+            record["cache_hit"] = cached is not None
+            if cached is not None:
+                return cached
+
+        resp = caller.call(
+            _client().chat.completions.create,
+            model=OPENAI_MODEL,
+            messages=_messages(system_prompt, user_prompt),
+            temperature=temperature,
+        )
+        _record_usage(record, getattr(resp, "usage", None))
+        content = resp.choices[0].message.content.strip()
+
+        if use_cache:
+            response_cache.set(key, content)
+        return content
+
+
+async def achat_completion(system_prompt: str, user_prompt: str, temperature=0.2, use_cache=True):
+    """Async variant of chat_completion; shares the same response cache."""
+    with span("llm", model=OPENAI_MODEL) as record:
+        key = response_cache.make_key(OPENAI_MODEL, system_prompt, user_prompt, temperature)
+        if use_cache:
+            cached = response_cache.get(key)
+            record["cache_hit"] = cached is not None
+            if cached is not None:
+                return cached
+
+        resp = await caller.acall(
+            _async_client().chat.completions.create,
+            model=OPENAI_MODEL,
+            messages=_messages(system_prompt, user_prompt),
+            temperature=temperature,
+        )
+        _record_usage(record, getattr(resp, "usage", None))
+        content = resp.choices[0].message.content.strip()
+
+        if use_cache:
+            response_cache.set(key, content)
+        return content
+
+
+def stream_chat_completion(system_prompt: str, user_prompt: str, temperature=0.2, use_cache=True):
+    """Yield the completion as text deltas; cached responses arrive in one piece."""
+    with span("llm", model=OPENAI_MODEL, stream=True) as record:
+        key = response_cache.make_key(OPENAI_MODEL, system_prompt, user_prompt, temperature)
+        if use_cache:
+            cached = response_cache.get(key)
+            record["cache_hit"] = cached is not None
+            if cached is not None:
+                yield cached
+                return
+
+        t0 = time.perf_counter()
+        # Retries cover opening the stream; a stream that dies midway surfaces
+        # as an error. The concurrency slot is held until the stream ends.
+        stream = caller.stream(
+            _client().chat.completions.create,
+            model=OPENAI_MODEL,
+            messages=_messages(system_prompt, user_prompt),
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        parts = []
+        for chunk in stream:
+            _record_usage(record, getattr(chunk, "usage", None))
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not parts:
+                    record["ttft_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+                parts.append(delta)
+                yield delta
+
+        if use_cache:
+            response_cache.set(key, "".join(parts).strip())
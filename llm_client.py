@@ -0,0 +1,233 @@
+"""Resilience layer around the OpenAI client.
+
+``ResilientCaller`` wraps each API call with:
+- a cap on in-flight requests (process-wide for threads, per event loop for
+  async callers), held by streams until they are consumed or closed,
+- jittered exponential backoff on 429 / 5xx / timeouts / connection errors,
+  honouring ``Retry-After`` when the server sends one,
+- a circuit breaker that fails fast while the API is persistently failing;
+  only retryable errors count, once per call after its retries run out.
+
+Timeouts and connection pooling live on the OpenAI client itself; see
+``build_client()`` / ``build_async_client()``.
+"""
+import time
+import random
+import asyncio
+import weakref
+import threading
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures; after
+    ``reset_timeout`` seconds lets one trial call through (half-open)."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release(self):
+        """End a call that says nothing about API health (e.g. a 400)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+def is_retryable(exc):
+    """429/5xx responses, timeouts and dropped connections are worth retrying."""
+    try:
+        import openai
+    except ImportError:
+        openai = None
+    if openai and isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return getattr(exc, "status_code", None) in RETRYABLE_STATUS
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class ResilientCaller:
+    def __init__(self, max_retries=4, base_delay=0.5, max_delay=20.0,
+                 max_concurrency=8, breaker=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_concurrency = max_concurrency
+        # Threads share one semaphore; each event loop gets an asyncio one
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._loop_slots = weakref.WeakKeyDictionary()
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = 0
+
+    def _delay(self, attempt, exc):
+        server_hint = _retry_after(exc)
+        if server_hint is not None:
+            return min(server_hint, self.max_delay)
+        # "Full jitter" exponential backoff
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM API circuit is open; failing fast")
+
+    def _should_retry(self, attempt, exc):
+        # A 4xx means the API is up: it doesn't count toward the breaker. An
+        # outage counts once per call, after its retries are used up.
+        if not is_retryable(exc):
+            self.breaker.release()
+            return False
+        if attempt == self.max_retries:
+            self.breaker.record_failure()
+            return False
+        self.retries += 1
+        return True
+
+    def _async_slots(self):
+        loop = asyncio.get_running_loop()
+        slots = self._loop_slots.get(loop)
+        if slots is None:
+            slots = self._loop_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+        return slots
+
+    def call(self, fn, *args, **kwargs):
+        self._check_breaker()
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._slots:
+                    result = fn(*args, **kwargs)
+            except Exception as exc:
+                if not self._should_retry(attempt, exc):
+                    raise
+                time.sleep(self._delay(attempt, exc))
+            else:
+                self.breaker.record_success()
+                return result
+
+    def stream(self, fn, *args, **kwargs):
+        """Like ``call`` for a streaming request, yielding its chunks.
+
+        Retries cover opening the stream. The concurrency slot is held until
+        the stream is exhausted or this generator is closed.
+        """
+        self._check_breaker()
+        for attempt in range(self.max_retries + 1):
+            self._slots.acquire()
+            try:
+                stream = fn(*args, **kwargs)
+            except Exception as exc:
+                self._slots.release()
+                if not self._should_retry(attempt, exc):
+                    raise
+                time.sleep(self._delay(attempt, exc))
+                continue
+            self.breaker.record_success()
+            try:
+                yield from stream
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+                self._slots.release()
+            return
+
+    async def acall(self, fn, *args, **kwargs):
+        self._check_breaker()
+        slots = self._async_slots()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with slots:
+                    result = await fn(*args, **kwargs)
+            except Exception as exc:
+                if not self._should_retry(attempt, exc):
+                    raise
+                await asyncio.sleep(self._delay(attempt, exc))
+            else:
+                self.breaker.record_success()
+                return result
+
+    def stats(self):
+        return {
+            "retries": self.retries,
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+        }
+
+
+def _limits(max_connections):
+    import httpx
+    return httpx.Limits(max_connections=max_connections,
+                        max_keepalive_connections=max_connections)
+
+
+def build_client(api_key, base_url=None, timeout=30.0, max_connections=20):
+    """Sync OpenAI client with a timeout and pooled keep-alive connections.
+
+    SDK-level retries are disabled; ``ResilientCaller`` owns retry policy.
+    """
+    from openai import OpenAI, DefaultHttpxClient
+
+    return OpenAI(
+        api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0,
+        http_client=DefaultHttpxClient(limits=_limits(max_connections), timeout=timeout),
+    )
+
+
+def build_async_client(api_key, base_url=None, timeout=30.0, max_connections=20):
+    """Async counterpart of ``build_client``.
+
+    Its connection pool belongs to the event loop it is first used on, so
+    build one per loop.
+    """
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    return AsyncOpenAI(
+        api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0,
+        http_client=DefaultAsyncHttpxClient(limits=_limits(max_connections), timeout=timeout),
+    )
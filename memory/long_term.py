@@ -1,22 +1,123 @@
 import os
 import json
+import time
+import sqlite3
+import threading
+
 
 class LongTermMemory:
-    def __init__(self, file="memory/user_profile.json"):
-        os.makedirs("memory", exist_ok=True)
+    """Query history in SQLite (WAL mode) with O(1) appends and bounded size.
+
+    Concurrent Streamlit sessions (threads or processes) can append safely:
+    WAL lets readers proceed while one writer commits, and ``busy_timeout``
+    makes competing writers wait instead of failing. A per-query counter
+    table keeps "top repeated queries" reads cheap. Every ``COMPACT_EVERY``
+    rows (counted by the log's own row IDs, so short-lived instances share
+    the count) the raw log is cut to the newest ``max_entries`` rows and the
+    counter table to its ``max_entries`` most repeated, most recent queries.
+    """
+
+    COMPACT_EVERY = 100
+
+    def __init__(self, file="memory/user_profile.sqlite",
+                 legacy_file="memory/user_profile.json", max_entries=10000):
+        os.makedirs(os.path.dirname(file) or ".", exist_ok=True)
         self.file = file
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
 
-        if not os.path.exists(self.file):
-            with open(self.file, "w") as f:
-                json.dump({"past_queries": []}, f)
+        is_new = not os.path.exists(self.file)
+        self._conn = sqlite3.connect(self.file, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS queries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                query TEXT NOT NULL,
+                ts REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS query_counts (
+                query TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                last_ts REAL NOT NULL
+            );
+            DROP INDEX IF EXISTS idx_query_counts_count;
+            CREATE INDEX IF NOT EXISTS idx_query_counts_rank ON query_counts (count, last_ts);
+            """
+        )
 
-    def load(self):
-        return json.load(open(self.file))
+        if is_new and legacy_file and os.path.exists(legacy_file):
+            self._import_legacy(legacy_file)
+
+    def _import_legacy(self, legacy_file):
+        """One-time import of the old JSON history file."""
+        with open(legacy_file, encoding="utf-8") as f:
+            past = json.load(f).get("past_queries", [])
+        for query in past:
+            self._append(query)
+        self._conn.commit()
+        self._compact()
 
-    def save(self, data):
-        json.dump(data, open(self.file, "w"), indent=2)
+    def _append(self, query):
+        now = time.time()
+        row_id = self._conn.execute(
+            "INSERT INTO queries (query, ts) VALUES (?, ?)", (query, now)
+        ).lastrowid
+        self._conn.execute(
+            "INSERT INTO query_counts (query, count, last_ts) VALUES (?, 1, ?) "
+            "ON CONFLICT(query) DO UPDATE SET count = count + 1, last_ts = excluded.last_ts",
+            (query, now),
+        )
+        return row_id
 
     def add_query(self, query):
-        data = self.load()
-        data["past_queries"].append(query)
-        self.save(data)
+        with self._lock:
+            row_id = self._append(query)
+            self._conn.commit()
+            if row_id % self.COMPACT_EVERY == 0:
+                self._compact()
+
+    def _compact(self):
+        self._conn.execute(
+            "DELETE FROM queries WHERE id <= "
+            "(SELECT id FROM queries ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        # Evict the least repeated, then least recently asked, queries
+        self._conn.execute(
+            "DELETE FROM query_counts WHERE query IN ("
+            "SELECT query FROM query_counts ORDER BY count, last_ts "
+            "LIMIT max(0, (SELECT COUNT(*) FROM query_counts) - ?))",
+            (self.max_entries,),
+        )
+        self._conn.commit()
+
+    def compact(self):
+        """Trim the log and the repeat counts to ``max_entries`` rows each."""
+        with self._lock:
+            self._compact()
+
+    def recent(self, n=10):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query FROM queries ORDER BY id DESC LIMIT ?", (n,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def top_queries(self, n=10):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query, count FROM query_counts ORDER BY count DESC, last_ts DESC LIMIT ?",
+                (n,),
+            ).fetchall()
+        return [(q, c) for q, c in rows]
+
+    def load(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT query FROM queries ORDER BY id").fetchall()
+        return {"past_queries": [r[0] for r in rows]}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
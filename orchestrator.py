@@ -1,18 +1,116 @@
-from typing import Dict, Any, List
+import re
+import time
+import asyncio
+from typing import Dict, Any, Iterator, List
 
+import llm
+import resources
+import tracing
+from config import TRACE_JSONL_PATH, RERANK_MODE, RERANK_FETCH_K, RERANK_LAMBDA, RERANK_BUDGET_MS
+from rerank import Reranker
 from agents import PlannerAgent, RetrieverAgent, SummarizerAgent, AnalystAgent
 from memory import ShortTermMemory, LongTermMemory
 
+_COMPARE_SPLIT = re.compile(r"\s+vs\.?\s+|\s+versus\s+|\s*,\s*", re.IGNORECASE)
+
+
+def split_products(product) -> List[str]:
+    """Turn the planner's product field into a list of product names."""
+    if not product:
+        return []
+    if isinstance(product, list):
+        return [str(p) for p in product if p]
+    return [p for p in _COMPARE_SPLIT.split(str(product)) if p]
+
+
+def review_ratings(metadatas) -> List[float]:
+    """Ratings of the retrieved reviews, one per copy the build deduplicated."""
+    return [
+        float(m.get("reviews.rating", 0))
+        for m in metadatas
+        for _ in range(int(m.get("dup_count", 1)))
+    ]
+
+
+def make_reranker(mode=RERANK_MODE):
+    """Second retrieval stage as configured, or None when RERANK_MODE=off."""
+    if mode == "off":
+        return None
+    return Reranker(fetch_k=RERANK_FETCH_K, lambda_mult=RERANK_LAMBDA,
+                    cross_encoder=mode == "cross", budget_ms=RERANK_BUDGET_MS)
+
+
+class RateLimiter:
+    """Async limiter spacing calls at least ``1 / rate`` seconds apart."""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
 
 class ReviewInsightOrchestrator:
-    def __init__(self):
-        self.planner = PlannerAgent()
-        self.retriever = RetrieverAgent()
+    def __init__(self, top_k: int = 8):
+        # Reviews retrieved per query; the summarizer map-reduces large sets
+        self.top_k = top_k
+        self.retriever = RetrieverAgent(reranker=make_reranker())
+        # The planner resolves most queries locally from the catalogue and the
+        # corpus' top terms, calling the LLM only when it can't find a product
+        self._generation = resources.check_generation()
+        self.planner = PlannerAgent(
+            product_index=self.retriever.product_index, aspect_terms=self._aspect_terms()
+        )
         self.summarizer = SummarizerAgent()
         self.analyst = AnalystAgent()
         self.long_memory = LongTermMemory()
+        tracing.configure(jsonl_path=TRACE_JSONL_PATH)
+
+    @property
+    def aggregates(self):
+        # Per-product corpus stats written by build_vectorstore.py
+        return resources.get_aggregates()
+
+    def _aspect_terms(self):
+        aggregates = self.aggregates
+        return {t for terms in aggregates.top_terms.values() for t in terms} if aggregates else ()
+
+    def _refresh(self):
+        """Point the planner at the new catalogue once the vectorstore is rebuilt."""
+        generation = resources.check_generation()
+        if generation != self._generation:
+            self._generation = generation
+            self.planner.use_index(self.retriever.product_index, self._aspect_terms())
+
+    def close(self):
+        """Release this session's share of the shared resources."""
+        self.retriever.close()
+        self.long_memory.close()
+
+    def corpus_stats(self, product):
+        """Corpus-level rating stats for the planner's product, if known."""
+        index, aggregates = self.retriever.product_index, self.aggregates
+        if aggregates is None or index is None:
+            return None
+        return aggregates.stats(index.match(product))
 
     def run(self, user_query: str, short_memory: ShortTermMemory) -> Dict[str, Any]:
+        with tracing.trace("query", mode="sync") as t:
+            result = self._run(user_query, short_memory)
+        result["trace"] = t.to_dict()
+        return result
+
+    def _run(self, user_query: str, short_memory: ShortTermMemory) -> Dict[str, Any]:
+        self._refresh()
         plan = self.planner.plan(user_query, short_memory.get_all())
         product = plan.get("product")
         aspect = plan.get("aspect")
@@ -21,18 +119,160 @@ class ReviewInsightOrchestrator:
         self.long_memory.add_query(user_query)
 
         retrieval = self.retriever.retrieve(
-            product=product, aspect=aspect, raw_query=user_query, top_k=8
+            product=product, aspect=aspect, raw_query=user_query, top_k=self.top_k
         )
 
         docs = retrieval["documents"][0]
         metadatas = retrieval["metadatas"][0]
-        ratings = [float(m.get("reviews.rating", 0)) for m in metadatas]
+        ratings = review_ratings(metadatas)
 
         summary = self.summarizer.summarize(
             docs, product=product, aspect=aspect
         )
 
-        analysis = self.analyst.analyze(summary, ratings)
+        corpus_stats = self.corpus_stats(product)
+        analysis = self.analyst.analyze(summary, ratings, corpus_stats)
+
+        return {
+            "plan": plan,
+            "docs": docs,
+            "metadatas": metadatas,
+            "summary": summary,
+            "analysis": analysis,
+            "corpus_stats": corpus_stats,
+        }
+
+    def run_stream(self, user_query: str, short_memory: ShortTermMemory) -> Iterator[Dict[str, Any]]:
+        """Run the pipeline, yielding stage events as soon as each is ready.
+
+        Events: ``plan``, ``docs``, ``summary_delta`` / ``analysis_delta``
+        (with ``text``), and finally ``done`` carrying the same dict ``run``
+        returns.
+        """
+        done = None
+        with tracing.trace("query", mode="stream") as t:
+            for event in self._run_stream(user_query, short_memory):
+                if event["type"] == "done":
+                    done = event
+                else:
+                    yield event
+        done["result"]["trace"] = t.to_dict()
+        yield done
+
+    def _run_stream(self, user_query: str, short_memory: ShortTermMemory) -> Iterator[Dict[str, Any]]:
+        self._refresh()
+        plan = self.planner.plan(user_query, short_memory.get_all())
+        product = plan.get("product")
+        aspect = plan.get("aspect")
+        yield {"type": "plan", "plan": plan}
+
+        short_memory.update(last_product=product, last_aspect=aspect)
+        self.long_memory.add_query(user_query)
+
+        retrieval = self.retriever.retrieve(
+            product=product, aspect=aspect, raw_query=user_query, top_k=self.top_k
+        )
+        docs = retrieval["documents"][0]
+        metadatas = retrieval["metadatas"][0]
+        ratings = review_ratings(metadatas)
+        yield {"type": "docs", "docs": docs, "metadatas": metadatas}
+
+        parts = []
+        for delta in self.summarizer.summarize_stream(docs, product=product, aspect=aspect):
+            parts.append(delta)
+            yield {"type": "summary_delta", "text": delta}
+        summary = "".join(parts).strip()
+
+        corpus_stats = self.corpus_stats(product)
+        parts = []
+        for delta in self.analyst.analyze_stream(summary, ratings, corpus_stats):
+            parts.append(delta)
+            yield {"type": "analysis_delta", "text": delta}
+        analysis = "".join(parts).strip()
+
+        yield {
+            "type": "done",
+            "result": {
+                "plan": plan,
+                "docs": docs,
+                "metadatas": metadatas,
+                "summary": summary,
+                "analysis": analysis,
+                "corpus_stats": corpus_stats,
+            },
+        }
+
+    async def _aretrieve(self, **kwargs):
+        # Encoding + Chroma queries are blocking; keep them off the event loop
+        return await asyncio.to_thread(self.retriever.retrieve, **kwargs)
+
+    async def _aretrieve_and_summarize(self, product, aspect, user_query):
+        retrieval = await self._aretrieve(
+            product=product, aspect=aspect, raw_query=user_query, top_k=self.top_k
+        )
+        docs = retrieval["documents"][0]
+        metadatas = retrieval["metadatas"][0]
+        summary = await self.summarizer.asummarize(docs, product=product, aspect=aspect)
+        return docs, metadatas, summary
+
+    async def arun(self, user_query: str, short_memory: ShortTermMemory) -> Dict[str, Any]:
+        """Async pipeline: overlaps planning with retrieval and fans out comparisons."""
+        with tracing.trace("query", mode="async") as t:
+            result = await self._arun(user_query, short_memory)
+        result["trace"] = t.to_dict()
+        return result
+
+    async def _arun(self, user_query: str, short_memory: ShortTermMemory) -> Dict[str, Any]:
+        self._refresh()
+        # Speculatively retrieve for the raw query while the planner runs
+        plan_task = asyncio.create_task(
+            self.planner.aplan(user_query, short_memory.get_all())
+        )
+        raw_retrieval_task = asyncio.create_task(
+            self._aretrieve(raw_query=user_query, top_k=self.top_k)
+        )
+        memory_task = asyncio.create_task(
+            asyncio.to_thread(self.long_memory.add_query, user_query)
+        )
+
+        plan = await plan_task
+        product = plan.get("product")
+        aspect = plan.get("aspect")
+        short_memory.update(last_product=product, last_aspect=aspect)
+
+        products = split_products(product)
+        if len(products) > 1:
+            # Comparison query: retrieve + summarize each product in parallel
+            raw_retrieval_task.cancel()
+            parts = await asyncio.gather(*[
+                self._aretrieve_and_summarize(p, aspect, user_query) for p in products
+            ])
+            docs = [d for part_docs, _, _ in parts for d in part_docs]
+            metadatas = [m for _, part_metas, _ in parts for m in part_metas]
+            summary = "\n\n".join(
+                f"### {p}\n{part_summary}" for p, (_, _, part_summary) in zip(products, parts)
+            )
+        else:
+            if product or aspect:
+                # The speculative search only matches run() when the planner
+                # found neither; otherwise search with its product and aspect
+                # (filtered when the product is known)
+                raw_retrieval_task.cancel()
+                retrieval = await self._aretrieve(
+                    product=product, aspect=aspect, raw_query=user_query, top_k=self.top_k
+                )
+            else:
+                retrieval = await raw_retrieval_task
+            docs = retrieval["documents"][0]
+            metadatas = retrieval["metadatas"][0]
+            summary = await self.summarizer.asummarize(
+                docs, product=product, aspect=aspect
+            )
+
+        ratings = review_ratings(metadatas)
+        corpus_stats = self.corpus_stats(product)
+        analysis = await self.analyst.aanalyze(summary, ratings, corpus_stats)
+        await memory_task
 
         return {
             "plan": plan,
@@ -40,4 +280,86 @@ class ReviewInsightOrchestrator:
             "metadatas": metadatas,
             "summary": summary,
             "analysis": analysis,
+            "corpus_stats": corpus_stats,
         }
+
+    def run_batch(self, queries: List[str], concurrency: int = 8,
+                  rate_limit: float = None, top_k: int = None) -> List[Dict[str, Any]]:
+        """Run many queries for bulk reports; results keep input order.
+
+        Planning, summarizing and analysis go through a pool of at most
+        ``concurrency`` in-flight LLM calls, optionally capped at
+        ``rate_limit`` calls per second. Retrieval for all queries is one
+        batched encode plus one vector query. Batch queries are not written
+        to long-term memory.
+        """
+        with tracing.trace("batch", queries=len(queries)):
+            return llm.run_async(self.arun_batch(queries, concurrency, rate_limit, top_k))
+
+    async def arun_batch(self, queries: List[str], concurrency: int = 8,
+                         rate_limit: float = None, top_k: int = None) -> List[Dict[str, Any]]:
+        self._refresh()
+        top_k = top_k or self.top_k
+        semaphore = asyncio.Semaphore(concurrency)
+        limiter = RateLimiter(rate_limit)
+
+        async def call(fn, *args, **kwargs):
+            async with semaphore:
+                await limiter.wait()
+                return await fn(*args, **kwargs)
+
+        timings = [{} for _ in queries]
+
+        async def plan_one(i, query):
+            t0 = time.perf_counter()
+            plan = await call(self.planner.aplan, query, {})
+            timings[i]["plan"] = time.perf_counter() - t0
+            return plan
+
+        plans = await asyncio.gather(*[plan_one(i, q) for i, q in enumerate(queries)])
+
+        t0 = time.perf_counter()
+        retrievals = await asyncio.to_thread(
+            self.retriever.retrieve_batch,
+            [
+                {"product": p.get("product"), "aspect": p.get("aspect"), "raw_query": q}
+                for q, p in zip(queries, plans)
+            ],
+            top_k,
+        )
+        retrieve_secs = time.perf_counter() - t0
+
+        async def finish_one(i, query, plan, retrieval):
+            product = plan.get("product")
+            aspect = plan.get("aspect")
+            docs = retrieval["documents"][0]
+            metadatas = retrieval["metadatas"][0]
+            ratings = review_ratings(metadatas)
+
+            t0 = time.perf_counter()
+            summary = await call(self.summarizer.asummarize, docs, product=product, aspect=aspect)
+            timings[i]["summarize"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            corpus_stats = self.corpus_stats(product)
+            analysis = await call(self.analyst.aanalyze, summary, ratings, corpus_stats)
+            timings[i]["analyze"] = time.perf_counter() - t0
+
+            # Retrieval is shared by the whole batch; report its amortized cost
+            timings[i]["retrieve"] = retrieve_secs / len(queries)
+            timings[i]["total"] = sum(timings[i].values())
+            return {
+                "query": query,
+                "plan": plan,
+                "docs": docs,
+                "metadatas": metadatas,
+                "summary": summary,
+                "analysis": analysis,
+                "corpus_stats": corpus_stats,
+                "timing": timings[i],
+            }
+
+        return await asyncio.gather(*[
+            finish_one(i, q, p, r)
+            for i, (q, p, r) in enumerate(zip(queries, plans, retrievals))
+        ])
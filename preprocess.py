@@ -1,72 +1,184 @@
 import os
+import re
 import glob
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download("punkt_tab")
+# NLTK data this module needs, by nltk.data path
+NLTK_RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "punkt_tab": "tokenizers/punkt_tab",
+    "stopwords": "corpora/stopwords",
+}
+
+REVIEW_COLUMNS = ["name", "reviews.text", "reviews.rating"]
+CHUNK_SIZE = 5000
+
+
+def ensure_nltk_resources(names=tuple(NLTK_RESOURCES), download=True):
+    """Check NLTK data locally; only hit the network for resources that are missing."""
+    import nltk
+
+    for name in names:
+        try:
+            nltk.data.find(NLTK_RESOURCES[name])
+        except LookupError:
+            if not (download and nltk.download(name, quiet=True)):
+                raise LookupError(
+                    f"NLTK resource '{name}' is missing and could not be downloaded. "
+                    f"Run: python -m nltk.downloader {name}"
+                )
+
+
+@lru_cache(maxsize=None)
+def get_stop_words() -> frozenset:
+    ensure_nltk_resources(["stopwords"])
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words("english"))
 
 
-stop_words = set(stopwords.words("english"))
+@lru_cache(maxsize=None)
+def _word_tokenize():
+    ensure_nltk_resources(["punkt", "punkt_tab"])
+    from nltk.tokenize import word_tokenize
+    return word_tokenize
 
 
 def preprocess_text(text: str) -> str:
     if not isinstance(text, str):
         return ""
+    stop_words = get_stop_words()
     text = text.lower()
-    tokens = word_tokenize(text)
+    tokens = _word_tokenize()(text)
     tokens = [t for t in tokens if t.isalnum() and t not in stop_words]
     return " ".join(tokens)
 
 
-def load_and_preprocess(data_folder="data") -> pd.DataFrame:
-    """Loads ALL Datafiniti Amazon review CSV files, extracts needed columns."""
+# ---------- Fast batch cleaning ----------
+# A compiled-regex approximation of word_tokenize + the alnum/stopword filter
+# above. Only alnum tokens survive the filter, so we just need to split text
+# at the same boundaries as the Treebank tokenizer and drop anything that
+# would have come out non-alnum.
+
+# Punctuation Treebank always splits off (commas/colons only outside numbers),
+# including curly/chevron quotes, unicode dashes, "*" and backtick runs
+_SPLIT_RE = re.compile(
+    r"\.{2,}|--|''|[;@#$%&?!\"()\[\]{}<>*«»“”‘’„\u2012-\u2015]|`+|[,:](?!\d)"
+)
+# Clitics Treebank splits off the end of a word ("don't" -> "do" + "n't")
+_CLITIC_RE = re.compile(r"(?:n't|'s|'m|'d|'ll|'re|'ve|')$")
+# Contractions Treebank splits into two alnum halves (at word boundaries)
+_SPECIAL_RE = re.compile(r"\b(can)(not)\b|\b(gim|lem)(me)\b|\b(gon|wan)(na)\b|\b(got)(ta)\b")
+
+
+def _split_special(m):
+    return " " + " ".join(g for g in m.groups() if g) + " "
+
+MIN_PARALLEL_BATCH = 2000
+
+
+def fast_preprocess_text(text: str, stop_words=None) -> str:
+    """Regex-based equivalent of ``preprocess_text`` (no NLTK tokenizer)."""
+    if not isinstance(text, str):
+        return ""
+    if stop_words is None:
+        stop_words = get_stop_words()
+    out = []
+    # "…" is deliberately not split: word_tokenize keeps "great…" as one
+    # non-alnum token, so the word is dropped on both paths
+    text = _SPECIAL_RE.sub(_split_special, _SPLIT_RE.sub(" ", text.lower()))
+    for word in text.split():
+        token = _CLITIC_RE.sub("", word.strip("'").rstrip("."))
+        if token.isalnum() and token not in stop_words:
+            out.append(token)
+    return " ".join(out)
+
 
-    csv_files = glob.glob(os.path.join(data_folder, "*.csv"))
+def _clean_batch(texts):
+    stop_words = get_stop_words()
+    return [fast_preprocess_text(t, stop_words) for t in texts]
+
+
+def clean_texts(texts, executor=None, workers=None, batch_size=1000):
+    """Clean a list/array of texts, fanning batches out over a process pool.
+
+    Pass a long-lived ``executor`` to reuse worker processes across calls;
+    otherwise a temporary pool of ``workers`` processes is created for large
+    inputs and small inputs are cleaned in-process.
+    """
+    texts = list(texts)
+    if executor is None and (workers == 1 or len(texts) < MIN_PARALLEL_BATCH):
+        return _clean_batch(texts)
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    if executor is not None:
+        results = executor.map(_clean_batch, batches)
+        return [t for batch in results for t in batch]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_clean_batch, batches)
+        return [t for batch in results for t in batch]
+
+
+def iter_raw_chunks(data_folder="data", chunksize=CHUNK_SIZE, failed=None):
+    """Stream Datafiniti review CSVs in bounded chunks, reading only the needed columns.
+
+    Files that raise while being read are skipped (possibly after some of
+    their chunks were yielded) and appended to ``failed`` if it is given.
+    """
+
+    csv_files = sorted(glob.glob(os.path.join(data_folder, "*.csv")))
 
     if not csv_files:
         raise FileNotFoundError("No .csv files found in /data folder!")
 
     print(f"Found {len(csv_files)} CSV files.")
-    dfs = []
+    found_any = False
 
     for file in csv_files:
         try:
-            df = pd.read_csv(file, low_memory=False)
-
-            # Keep only columns we need
-            col_map = {
-                "name": "name",
-                "reviews.text": "reviews.text",
-                "reviews.rating": "reviews.rating",
-            }
-
-            missing = [c for c in col_map if c not in df.columns]
+            header = pd.read_csv(file, nrows=0).columns
+            missing = [c for c in REVIEW_COLUMNS if c not in header]
             if missing:
                 print(f"WARNING: Missing columns {missing} in {file}. Skipping.")
                 continue
 
-            df = df[list(col_map.keys())]
-            df.rename(columns=col_map, inplace=True)
-
-            dfs.append(df)
+            reader = pd.read_csv(
+                file, usecols=REVIEW_COLUMNS, chunksize=chunksize, low_memory=False
+            )
+            for chunk in reader:
+                found_any = True
+                chunk["source"] = os.path.basename(file)
+                yield chunk
 
         except Exception as e:
             print(f"Failed reading {file}: {e}")
+            if failed is not None:
+                failed.append(file)
 
-    if not dfs:
+    if not found_any:
         raise RuntimeError("No CSV files had the required review fields.")
 
-    combined = pd.concat(dfs, ignore_index=True)
-    print("Combined dataset size:", len(combined))
 
-    # Clean text
-    print("Cleaning text...")
-    combined["clean_text"] = combined["reviews.text"].astype(str).apply(preprocess_text)
+def clean_chunk(df: pd.DataFrame, executor=None) -> pd.DataFrame:
+    """Add the ``clean_text`` column to a chunk of raw reviews."""
+    df["clean_text"] = clean_texts(df["reviews.text"].astype(str), executor=executor)
+    return df
+
+
+def iter_reviews(data_folder="data", chunksize=CHUNK_SIZE, executor=None):
+    """Yield cleaned review chunks; peak memory is bounded by ``chunksize``."""
+    for chunk in iter_raw_chunks(data_folder, chunksize):
+        yield clean_chunk(chunk, executor=executor)
 
+
+def load_and_preprocess(data_folder="data") -> pd.DataFrame:
+    """Loads ALL Datafiniti Amazon review CSV files, extracts needed columns."""
+    with ProcessPoolExecutor() as pool:
+        combined = pd.concat(iter_reviews(data_folder, executor=pool), ignore_index=True)
+    print("Combined dataset size:", len(combined))
     return combined
 
 
@@ -0,0 +1,60 @@
+import os
+import re
+import json
+
+PRODUCT_INDEX_FILE = os.path.join("vectorstore", "product_index.json")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text):
+    return set(_TOKEN_RE.findall(str(text).lower()))
+
+
+class ProductIndex:
+    """Maps free-text product mentions (e.g. "Kindle") to catalogue ``name`` values.
+
+    Built once at vectorstore build time from the distinct ``name`` column and
+    stored as a small inverted index (token -> name positions).
+    """
+
+    def __init__(self, names=None):
+        self.names = sorted(set(n for n in (names or []) if isinstance(n, str) and n))
+        self.postings = {}
+        for i, name in enumerate(self.names):
+            for tok in _tokens(name):
+                self.postings.setdefault(tok, []).append(i)
+
+    def match(self, product):
+        """Return every catalogue name containing all tokens of ``product``.
+
+        A list of products returns the union of the per-product matches.
+        """
+        if not product:
+            return []
+        if isinstance(product, list):
+            return sorted(set(n for p in product for n in self.match(p)))
+        # Ignore words that appear in no catalogue name ("the", "reviews", ...)
+        tokens = [t for t in _tokens(product) if t in self.postings]
+        if not tokens:
+            return []
+        hits = None
+        for tok in tokens:
+            ids = set(self.postings.get(tok, ()))
+            hits = ids if hits is None else hits & ids
+            if not hits:
+                return []
+        return [self.names[i] for i in sorted(hits)]
+
+    def save(self, path=PRODUCT_INDEX_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"names": self.names}, f)
+
+    @classmethod
+    def load(cls, path=PRODUCT_INDEX_FILE):
+        """Load a saved index, or return None if the build hasn't written one."""
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["names"])
@@ -0,0 +1,145 @@
+"""Second-stage reranking of over-fetched retrieval candidates.
+
+Maximal Marginal Relevance picks a diverse subset using the candidate
+embeddings the vector store already returned; an optional CPU cross-encoder
+then re-scores the survivors. Both run under a per-query time budget: once
+it is spent, MMR fills the remaining slots in first-stage order and the
+cross-encoder leaves unscored candidates where they were, so a slow query
+degrades to first-stage ranking instead of blocking.
+"""
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import resources
+
+
+def _unit(x):
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+def mmr(query_embedding, embeddings, k, lambda_mult=0.7, deadline=None):
+    """Indices of ``k`` candidates chosen by Maximal Marginal Relevance.
+
+    Each pick maximises ``lambda * sim(query, d) - (1 - lambda) * max sim(d, picked)``
+    (cosine similarities). Candidates are expected in first-stage rank order;
+    past ``deadline`` (a ``perf_counter`` value) the remaining picks follow it.
+    """
+    emb = _unit(embeddings)
+    n = len(emb)
+    k = min(k, n)
+    if k == 0:
+        return []
+    relevance = emb @ _unit(query_embedding)
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    picks = []
+    while len(picks) < k:
+        if deadline is not None and time.perf_counter() > deadline:
+            rest = np.flatnonzero(available)
+            picks.extend(rest[:k - len(picks)].tolist())
+            break
+        score = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        i = int(np.argmax(score))
+        picks.append(i)
+        available[i] = False
+        # One matrix-vector product per pick keeps the loop O(k * n * dim)
+        np.maximum(redundancy, emb @ emb[i], out=redundancy)
+    return picks
+
+
+class Budget:
+    """Per-query time allowance, charged only while that query is being reranked.
+
+    Queries retrieved in one batch are reranked one after another; each gets
+    its own ``ms`` instead of sharing a single deadline.
+    """
+
+    def __init__(self, ms):
+        self.left = ms / 1000 if ms is not None else None
+        self.exhausted = False
+
+    @contextmanager
+    def running(self):
+        """Yield a ``perf_counter`` deadline (or None) and charge the time used."""
+        t0 = time.perf_counter()
+        try:
+            yield t0 + max(self.left, 0.0) if self.left is not None else None
+        finally:
+            if self.left is not None:
+                self.left -= time.perf_counter() - t0
+                self.exhausted = self.exhausted or self.left <= 0
+
+
+class Reranker:
+    """MMR diversification plus an optional cross-encoder, within ``budget_ms``.
+
+    ``fetch_k`` is how many vector candidates the retriever should fetch.
+    With ``cross_encoder=True`` (the shared model from resources, loaded on
+    first use) or a CrossEncoder-like ``model``, MMR keeps
+    ``pool_factor * top_k`` survivors to score in batches of ``batch_size``.
+    """
+
+    def __init__(self, fetch_k=100, lambda_mult=0.7, cross_encoder=False, model=None,
+                 pool_factor=3, batch_size=16, budget_ms=50):
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+        self.cross_encoder = cross_encoder or model is not None
+        self._model = model
+        self.pool_factor = pool_factor
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.queries = 0
+        self.degraded = 0
+
+    @property
+    def model(self):
+        if self._model is None and self.cross_encoder:
+            self._model = resources.get_cross_encoder()
+        return self._model
+
+    def key(self):
+        """Settings that change results, for retrieval cache keys."""
+        return (self.fetch_k, self.lambda_mult, self.cross_encoder, self.pool_factor)
+
+    def pool_size(self, top_k):
+        """Candidates to keep ahead of the cross-encoder (``top_k`` without one)."""
+        return top_k * self.pool_factor if self.cross_encoder else top_k
+
+    def budget(self):
+        return Budget(self.budget_ms)
+
+    def diversify(self, query_embedding, embeddings, k, budget):
+        with budget.running() as deadline:
+            return mmr(query_embedding, embeddings, k, self.lambda_mult, deadline)
+
+    def cross_rank(self, query, documents, top_k, budget):
+        """Order ``documents`` by cross-encoder score; returns ``(order, scored)``.
+
+        Scores in batches, front to back, until the budget runs out;
+        unscored documents keep their incoming order after the scored ones.
+        """
+        model = self.model  # a first-use model load doesn't count against the budget
+        scores = []
+        with budget.running() as deadline:
+            for start in range(0, len(documents), self.batch_size):
+                if deadline is not None and time.perf_counter() > deadline:
+                    budget.exhausted = True
+                    break
+                batch = documents[start:start + self.batch_size]
+                scores.extend(model.predict([(query, doc) for doc in batch]).tolist())
+        order = np.argsort(-np.asarray(scores), kind="stable").tolist() if scores else []
+        return (order + list(range(len(scores), len(documents))))[:top_k], len(scores)
+
+    def record(self, budget):
+        self.queries += 1
+        self.degraded += budget.exhausted
+
+    def stats(self):
+        return {
+            "queries": self.queries,
+            "degraded": self.degraded,
+            "degraded_rate": self.degraded / self.queries if self.queries else 0.0,
+        }
@@ -0,0 +1,214 @@
+"""Process-wide shared heavy resources (embedding model, vector collection).
+
+Every ``RetrieverAgent`` — one per Streamlit session — reuses the same
+instances, which are loaded lazily on first use and guarded by a lock so
+concurrent sessions never load them twice. Resources read from the build's
+output are dropped by ``check_generation()`` once ``build_vectorstore.py``
+writes a new generation, and reload on next use.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+
+VECTOR_PATH = "vectorstore"
+COLLECTION_NAME = "reviews"
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+CROSS_ENCODER_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+GENERATION_FILE = os.path.join(VECTOR_PATH, "generation.json")
+# "chroma", or "local" for the memory-mapped engine in vector_store.py. Read
+# here rather than in config.py so the build doesn't need an OpenAI key.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+LOCAL_VECTOR_NPROBE = int(os.getenv("LOCAL_VECTOR_NPROBE", "8"))
+
+_lock = threading.RLock()
+_resources = {}
+_load_seconds = {}
+_consumers = 0
+_first_query_seconds = None
+# Loaded from the build's output, so reloaded after a rebuild
+BUILD_RESOURCES = ("client", "collection", "bm25", "embedding_cache", "product_index", "aggregates")
+_generation = None
+_stamp_mtime = False  # False: generation not checked yet
+
+
+def _get(name, factory):
+    res = _resources.get(name)
+    if res is not None:
+        return res
+    with _lock:
+        res = _resources.get(name)
+        if res is None:
+            t0 = time.perf_counter()
+            res = factory()
+            _load_seconds[name] = time.perf_counter() - t0
+            _resources[name] = res
+    return res
+
+
+def get_embedder():
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBED_MODEL_NAME)
+    return _get("embedder", load)
+
+
+def get_cross_encoder():
+    def load():
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(CROSS_ENCODER_NAME, device="cpu")
+    return _get("cross_encoder", load)
+
+
+def get_client():
+    def load():
+        import chromadb
+        return chromadb.PersistentClient(path=VECTOR_PATH)
+    return _get("client", load)
+
+
+def get_collection():
+    def load():
+        if VECTOR_BACKEND == "local":
+            from vector_store import LocalCollection
+            collection = LocalCollection.load(nprobe=LOCAL_VECTOR_NPROBE)
+            if collection is None:
+                raise FileNotFoundError(
+                    "No local vector store found; run build_vectorstore.py --export-local"
+                )
+            return collection
+        return get_client().get_collection(COLLECTION_NAME)
+    return _get("collection", load)
+
+
+def get_bm25_index():
+    """Memory-mapped BM25 index, or None if the build hasn't written one."""
+    def load():
+        from bm25 import BM25Index
+        return BM25Index.load()
+    return _get("bm25", load)
+
+
+def get_embedding_cache():
+    """Read-only view of the build's persistent embedding cache, or None if empty."""
+    def load():
+        from embedding_cache import EmbeddingCache
+        return EmbeddingCache.open_readonly(EMBED_MODEL_NAME)
+    return _get("embedding_cache", load)
+
+
+def get_product_index():
+    """Planner product -> catalogue names, or None if the build hasn't written it."""
+    def load():
+        from product_index import ProductIndex
+        return ProductIndex.load()
+    return _get("product_index", load)
+
+
+def get_aggregates():
+    """Per-product corpus stats, or None if the build hasn't written them."""
+    def load():
+        from aggregates import ProductAggregates
+        return ProductAggregates.load()
+    return _get("aggregates", load)
+
+
+def get_retrieval_cache():
+    def load():
+        from retrieval_cache import RetrievalCache
+        return RetrievalCache()
+    return _get("retrieval_cache", load)
+
+
+def write_generation(path=GENERATION_FILE):
+    """Stamp the vectorstore with a new build generation (invalidates query caches)."""
+    generation = uuid.uuid4().hex
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"generation": generation, "built_at": time.time()}, f)
+    os.replace(tmp, path)
+    return generation
+
+
+def read_generation(path=GENERATION_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("generation")
+
+
+def check_generation():
+    """Drop build-derived resources if the vectorstore has been rebuilt.
+
+    Returns the current generation. Cheap enough to call per query: the
+    generation file is only re-read when its mtime changes.
+    """
+    global _generation, _stamp_mtime
+    try:
+        mtime = os.stat(GENERATION_FILE).st_mtime
+    except FileNotFoundError:
+        mtime = None
+    if mtime == _stamp_mtime:
+        return _generation
+    with _lock:
+        if mtime != _stamp_mtime:
+            generation = read_generation()
+            if _stamp_mtime is not False and generation != _generation:
+                for name in BUILD_RESOURCES:
+                    _resources.pop(name, None)
+                    _load_seconds.pop(name, None)
+            _generation, _stamp_mtime = generation, mtime
+    return _generation
+
+
+def attach():
+    """Register one more consumer (e.g. a RetrieverAgent) of the shared resources."""
+    global _consumers
+    with _lock:
+        _consumers += 1
+
+
+def detach():
+    """Unregister a consumer added with ``attach()``."""
+    global _consumers
+    with _lock:
+        _consumers = max(_consumers - 1, 0)
+
+
+def record_query(seconds):
+    """Record retrieval latency; only the first query in the process is kept."""
+    global _first_query_seconds
+    with _lock:
+        if _first_query_seconds is None:
+            _first_query_seconds = seconds
+
+
+def warm_up(background=True):
+    """Load the model and collection ahead of the first query."""
+    def load_all():
+        get_embedder()
+        get_collection()
+    if background:
+        threading.Thread(target=load_all, name="resource-warm-up", daemon=True).start()
+    else:
+        load_all()
+
+
+def _model_bytes(model):
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+
+def stats():
+    """Load times, consumers sharing the resources and the memory that saves."""
+    with _lock:
+        model = _resources.get("embedder")
+        model_bytes = _model_bytes(model) if model is not None else 0
+        return {
+            "loaded": sorted(_resources),
+            "load_seconds": dict(_load_seconds),
+            "consumers": _consumers,
+            "model_mb": model_bytes / 1e6,
+            "memory_saved_mb": max(_consumers - 1, 0) * model_bytes / 1e6,
+            "first_query_seconds": _first_query_seconds,
+        }
@@ -0,0 +1,119 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import resources
+from llm_cache import ResponseCache
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU with hit/miss counters."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class RetrievalCache:
+    """Caches query -> embedding and (query, top_k, filter) -> results.
+
+    Entries are tied to the vectorstore build generation written by
+    ``build_vectorstore.py``; a new build clears the in-memory layer and, since
+    the generation is part of every key, makes old on-disk entries unreachable.
+    """
+
+    def __init__(self, max_embeddings=2048, max_results=1024, disk_path=None):
+        self.embeddings = LRUCache(max_embeddings)
+        self.results = LRUCache(max_results)
+        self.disk = ResponseCache(path=disk_path, ttl=0, max_entries=50000) if disk_path else None
+        self.generation = None
+        self._stamp_mtime = None
+
+    def check_generation(self):
+        """Drop everything cached if the vectorstore has been rebuilt."""
+        try:
+            mtime = os.stat(resources.GENERATION_FILE).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._stamp_mtime:
+            return
+        self._stamp_mtime = mtime
+        generation = resources.read_generation()
+        if generation != self.generation:
+            self.generation = generation
+            self.embeddings.clear()
+            self.results.clear()
+
+    def _key(self, *parts):
+        raw = json.dumps([self.generation, *parts], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _get(self, layer, key):
+        value = layer.get(key)
+        if value is None and self.disk is not None:
+            raw = self.disk.get(key)
+            if raw is not None:
+                value = json.loads(raw)
+                layer.set(key, value)
+        return value
+
+    def _set(self, layer, key, value):
+        layer.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, json.dumps(value))
+
+    def get_embedding(self, query):
+        return self._get(self.embeddings, self._key("embedding", query))
+
+    def set_embedding(self, query, embedding):
+        self._set(self.embeddings, self._key("embedding", query), embedding)
+
+    def result_key(self, *parts):
+        """Key for a retrieval result, e.g. ``(query, top_k, min_hits, where, mode)``."""
+        return self._key("result", *parts)
+
+    def get_result(self, key):
+        return self._get(self.results, key)
+
+    def set_result(self, key, result):
+        self._set(self.results, key, result)
+
+    def stats(self):
+        out = {"embeddings": self.embeddings.stats(), "results": self.results.stats()}
+        if self.disk is not None:
+            out["disk"] = self.disk.stats()
+        return out
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the top-level modules directly, as the app does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# config.py requires a key; no test talks to the real API
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
@@ -0,0 +1,134 @@
+"""Offline tests for the LLM path: response cache, retries, breaker, batching.
+
+Uses the stand-in clients from ``benchmarks.stub_llm`` and the HTTP server
+from ``benchmarks.fake_llm_server``, so no API key or network is needed.
+"""
+import pytest
+
+import llm
+import llm_cache
+from llm_cache import ResponseCache
+from llm_client import CircuitBreaker, CircuitOpenError, ResilientCaller, build_client
+from benchmarks import fake_llm_server
+from benchmarks.stub_llm import StubClient, AsyncStubClient, TEXT_REPLY
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    """Stub clients and a private response cache, restored after the test."""
+    sync, async_ = StubClient(latency=0), AsyncStubClient(latency=0)
+    monkeypatch.setattr(llm, "response_cache", ResponseCache(path=str(tmp_path / "llm_cache.sqlite")))
+    monkeypatch.setattr(llm, "client", llm.client)
+    monkeypatch.setattr(llm, "async_client", llm.async_client)
+    llm.set_client(sync, async_)
+    return sync, async_
+
+
+def test_response_cache_hit_and_miss(stub):
+    sync, _ = stub
+    first = llm.chat_completion("You are terse.", "How is the battery?")
+    second = llm.chat_completion("You are terse.", "How is the battery?")
+    assert first == second == TEXT_REPLY
+    assert sync.chat.completions.calls == 1
+    assert (llm.response_cache.hits, llm.response_cache.misses) == (1, 1)
+
+    llm.chat_completion("You are terse.", "How is the screen?")
+    llm.chat_completion("You are terse.", "How is the battery?", use_cache=False)
+    assert sync.chat.completions.calls == 3
+
+
+def test_response_cache_ttl_expiry(tmp_path, monkeypatch):
+    now = [1_000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(path=str(tmp_path / "ttl.sqlite"), ttl=60)
+    key = cache.make_key("model", "system", "user", 0.2)
+    cache.set(key, "answer")
+
+    now[0] += 59
+    assert cache.get(key) == "answer"
+    now[0] += 2
+    assert cache.get(key) is None
+    # Expired rows are dropped, not just skipped
+    now[0] -= 2
+    assert cache.get(key) is None
+
+
+class _ServerError(Exception):
+    status_code = 503
+
+
+def test_retry_then_circuit_breaker_opens():
+    caller = ResilientCaller(max_retries=1, base_delay=0, breaker=CircuitBreaker(2, 60))
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise _ServerError("overloaded")
+        return "ok"
+
+    assert caller.call(flaky) == "ok"
+    assert caller.retries == 1
+    assert caller.breaker.state == "closed"
+
+    def down():
+        attempts.append(1)
+        raise _ServerError("down")
+
+    # Each call uses up its retry, then counts once toward the breaker
+    for _ in range(2):
+        with pytest.raises(_ServerError):
+            caller.call(down)
+    assert caller.breaker.state == "open"
+
+    attempts.clear()
+    with pytest.raises(CircuitOpenError):
+        caller.call(down)
+    assert not attempts
+
+
+def test_retry_against_fake_server():
+    server = fake_llm_server.start(fail_first=1, reply="fine")
+    try:
+        client = build_client(api_key="sk-test", base_url=server.base_url)
+        caller = ResilientCaller(max_retries=2, base_delay=0, breaker=CircuitBreaker(2, 60))
+        response = caller.call(
+            client.chat.completions.create,
+            model="fake", messages=[{"role": "user", "content": "hi"}],
+        )
+        assert response.choices[0].message.content == "fine"
+        assert caller.retries == 1
+        assert server.requests == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_run_batch_against_stub_client(stub, tmp_path, monkeypatch):
+    from orchestrator import ReviewInsightOrchestrator
+
+    sync, async_ = stub
+    monkeypatch.chdir(tmp_path)
+    orchestrator = ReviewInsightOrchestrator(top_k=2)
+    docs = ["Battery lasts all week.", "Battery died after a month."]
+    metadatas = [{"name": "Kindle", "reviews.rating": 5}, {"name": "Kindle", "reviews.rating": 2, "dup_count": 2}]
+
+    def retrieve_batch(requests, top_k=8, min_hits=None):
+        return [{"query": r["raw_query"], "ids": [["a", "b"]], "documents": [docs],
+                 "metadatas": [metadatas], "distances": [[0.1, 0.2]], "where": None}
+                for r in requests]
+
+    monkeypatch.setattr(orchestrator.retriever, "retrieve_batch", retrieve_batch)
+    try:
+        queries = ["How is the Kindle battery?", "Is the Kindle screen good?", "How is the Kindle battery?"]
+        results = orchestrator.run_batch(queries, concurrency=2)
+    finally:
+        orchestrator.close()
+
+    assert [r["query"] for r in results] == queries
+    for result in results:
+        assert result["docs"] == docs
+        assert result["summary"]
+        assert set(result["timing"]) >= {"plan", "retrieve", "summarize", "analyze", "total"}
+    assert async_.chat.completions.calls > 0
+    assert sync.chat.completions.calls == 0
@@ -0,0 +1,193 @@
+"""Lightweight per-query tracing and process-wide latency metrics.
+
+``trace()`` opens a trace for one user query; ``span()`` times a stage
+inside it (planner, encode, vector query, LLM call, ...). Spans carry free
+attributes such as token counts, cost and cache-hit flags. The current
+trace is held in a ContextVar, so spans opened in asyncio tasks or
+``asyncio.to_thread`` attach to the right query. Thread pools don't copy
+context; wrap work submitted to one with ``in_context()``.
+
+Finished spans also feed process-wide aggregates, exported as Prometheus
+text (``prometheus_text()`` / ``serve_metrics()``), and finished traces
+can be appended to a JSONL file for offline analysis.
+"""
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current = contextvars.ContextVar("review_agent_trace", default=None)
+_lock = threading.Lock()
+_jsonl_path = None
+
+# span name -> {"count", "sum", "buckets"}
+_latency = {}
+# (metric, label tuple) -> value
+_counters = {}
+
+
+class Trace:
+    def __init__(self, name, **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration_ms = None
+        self.spans = []
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            **self.attrs,
+            "spans": list(self.spans),
+        }
+
+
+def configure(jsonl_path=None):
+    """Append every finished trace to ``jsonl_path`` (None disables it)."""
+    global _jsonl_path
+    _jsonl_path = jsonl_path
+
+
+def current_trace():
+    return _current.get()
+
+
+def in_context(fn):
+    """Wrap ``fn`` so each call runs in a copy of the caller's context."""
+    ctx = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # One copy per call: a context can't be entered by two threads at once
+        return ctx.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def _inc(metric, labels, value=1.0):
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def _observe(name, seconds):
+    with _lock:
+        m = _latency.setdefault(name, {"count": 0, "sum": 0.0, "buckets": [0] * len(BUCKETS)})
+        m["count"] += 1
+        m["sum"] += seconds
+        for i, le in enumerate(BUCKETS):
+            if seconds <= le:
+                m["buckets"][i] += 1
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a pipeline stage; attributes can be added to the yielded dict."""
+    record = {"name": name, **attrs}
+    t0 = time.perf_counter()
+    try:
+        yield record
+    finally:
+        seconds = time.perf_counter() - t0
+        record["duration_ms"] = round(seconds * 1000, 3)
+        _observe(name, seconds)
+        if "cache_hit" in record:
+            _inc("cache_lookups_total", {"span": name, "hit": str(bool(record["cache_hit"])).lower()})
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if record.get(kind):
+                _inc("llm_tokens_total", {"span": name, "kind": kind.split("_")[0]}, record[kind])
+        if record.get("cost_usd"):
+            _inc("llm_cost_usd_total", {"span": name}, record["cost_usd"])
+        trace = _current.get()
+        if trace is not None:
+            trace.spans.append(record)
+
+
+@contextmanager
+def trace(name, **attrs):
+    """Open a trace for one query; yields the Trace object."""
+    t = Trace(name, **attrs)
+    token = _current.set(t)
+    t0 = time.perf_counter()
+    try:
+        yield t
+    finally:
+        _current.reset(token)
+        seconds = time.perf_counter() - t0
+        t.duration_ms = round(seconds * 1000, 3)
+        _observe(name, seconds)
+        if _jsonl_path:
+            line = json.dumps(t.to_dict(), default=str)
+            with _lock, open(_jsonl_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def _labels(pairs):
+    return ",".join(f'{k}="{v}"' for k, v in pairs)
+
+
+def prometheus_text(prefix="review_agent"):
+    """Render the aggregates in the Prometheus text exposition format."""
+    lines = [f"# TYPE {prefix}_stage_seconds histogram"]
+    with _lock:
+        latency = {k: dict(v, buckets=list(v["buckets"])) for k, v in _latency.items()}
+        counters = dict(_counters)
+    for name, m in sorted(latency.items()):
+        for le, count in zip(BUCKETS, m["buckets"]):
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{le}"}} {count}')
+        lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {m["count"]}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {m["sum"]:.6f}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {m["count"]}')
+
+    typed = set()
+    for (metric, labels), value in sorted(counters.items()):
+        if metric not in typed:
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            typed.add(metric)
+        lines.append(f"{prefix}_{metric}{{{_labels(labels)}}} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def stage_summary():
+    """Mean latency per stage, for quick display (e.g. the app's debug panel)."""
+    with _lock:
+        return {
+            name: {"count": m["count"], "mean_ms": round(1000 * m["sum"] / m["count"], 2)}
+            for name, m in sorted(_latency.items()) if m["count"]
+        }
+
+
+def reset():
+    with _lock:
+        _latency.clear()
+        _counters.clear()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(port=9464, host="127.0.0.1"):
+    """Serve ``/metrics`` from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,348 @@
+"""Local vector engine: quantized, memory-mapped embeddings with a metadata sidecar.
+
+An alternative to Chroma for serving (``VECTOR_BACKEND=local``). The build
+exports the Chroma collection into ``vectorstore/local``:
+
+- ``vectors.npy``       int8 (per-row scale in ``scales.npy``), float16 or float32
+- ``sqnorms.npy``       squared norms of the original vectors (for L2 distances)
+- ``ids.npy``           review IDs; ``name_codes.npy`` catalogue name per row
+- ``ids_sorted.npy``    IDs sorted, ``ids_order.npy`` their rows (lookups by ID)
+- ``records.jsonl``     document + metadata per row, ``record_offsets.npy`` byte offsets
+- ``ivf_centroids.npy`` / ``ivf_offsets.npy`` when IVF partitioning is enabled
+- ``meta.json``         dtype, dimension, row count, names, IVF settings
+
+Every array is opened with ``mmap_mode="r"``, so loading is instant and all
+worker processes share one copy through the page cache. Search is a blocked
+matrix product with per-block top-k; with IVF only the ``nprobe`` lists
+closest to the query are scanned. ``LocalCollection`` answers the subset of
+the Chroma ``Collection`` API the retriever uses (``query``, ``get``,
+``count``), with the same squared-L2 distances.
+"""
+import os
+import json
+import mmap
+import shutil
+import tempfile
+
+import numpy as np
+
+LOCAL_STORE_DIR = os.path.join("vectorstore", "local")
+BLOCK_ROWS = 65536
+DEFAULT_INCLUDE = ("documents", "metadatas", "distances")
+
+
+def quantize(embeddings, dtype):
+    """Return ``(vectors, scales)``; scales is None unless dtype is int8."""
+    x = np.asarray(embeddings, dtype=np.float32)
+    if dtype == "int8":
+        scales = np.abs(x).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(x / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return x.astype(dtype), None
+
+
+def kmeans(x, k, iters=10, seed=0):
+    """Plain Lloyd's k-means on inner-product similarity (centroids normalized)."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        for c in range(k):
+            members = x[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return centroids
+
+
+class LocalStoreWriter:
+    """Streams rows to disk and lays out the memory-mapped store on ``finalize()``."""
+
+    def __init__(self, path=LOCAL_STORE_DIR, dtype="int8", nlist=0, train_rows=100_000):
+        if dtype not in ("int8", "float16", "float32"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.path = path
+        self.dtype = dtype
+        self.nlist = nlist
+        self.train_rows = train_rows
+        parent = os.path.dirname(path) or "."
+        os.makedirs(parent, exist_ok=True)
+        self.tmp = tempfile.mkdtemp(prefix="local_store_", dir=parent)
+        self._vectors = open(os.path.join(self.tmp, "vectors.f32"), "wb")
+        self._records = open(os.path.join(self.tmp, "records.raw"), "wb")
+        self.ids, self.names, self.name_codes, self.offsets = [], {}, [], [0]
+        self.dim = None
+
+    def add(self, ids, embeddings, documents, metadatas):
+        x = np.asarray(embeddings, dtype=np.float32)
+        if len(x) == 0:
+            return
+        self.dim = self.dim or x.shape[1]
+        self._vectors.write(x.tobytes())
+        for review_id, doc, meta in zip(ids, documents, metadatas):
+            line = json.dumps({"document": doc, "metadata": meta}, ensure_ascii=False).encode("utf-8") + b"\n"
+            self._records.write(line)
+            self.offsets.append(self.offsets[-1] + len(line))
+            self.ids.append(review_id)
+            name = (meta or {}).get("name")
+            self.name_codes.append(self.names.setdefault(name, len(self.names)) if isinstance(name, str) else -1)
+
+    def _ivf_order(self, raw):
+        n = len(raw)
+        nlist = min(self.nlist, n)
+        sample = raw[np.random.default_rng(0).choice(n, size=min(n, self.train_rows), replace=False)]
+        sample = sample / (np.linalg.norm(sample, axis=1, keepdims=True) + 1e-12)
+        centroids = kmeans(np.ascontiguousarray(sample), nlist)
+        assign = np.empty(n, dtype=np.int32)
+        for s in range(0, n, BLOCK_ROWS):
+            assign[s:s + BLOCK_ROWS] = np.argmax(raw[s:s + BLOCK_ROWS] @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        return order, centroids, offsets
+
+    def finalize(self):
+        self._vectors.close()
+        self._records.close()
+        n, tmp = len(self.ids), self.tmp
+        raw = (np.memmap(os.path.join(tmp, "vectors.f32"), dtype=np.float32, mode="r", shape=(n, self.dim))
+               if n else np.zeros((0, self.dim or 0), dtype=np.float32))
+
+        order, ivf = np.arange(n), None
+        if self.nlist and n:
+            order, centroids, offsets = self._ivf_order(raw)
+            np.save(os.path.join(tmp, "ivf_centroids.npy"), centroids)
+            np.save(os.path.join(tmp, "ivf_offsets.npy"), offsets)
+            ivf = len(centroids)
+
+        vectors = np.lib.format.open_memmap(
+            os.path.join(tmp, "vectors.npy"), mode="w+", dtype=self.dtype, shape=(n, self.dim or 0)
+        )
+        scales = np.ones(n, dtype=np.float32)
+        sqnorms = np.empty(n, dtype=np.float32)
+        for s in range(0, n, BLOCK_ROWS):
+            rows = order[s:s + BLOCK_ROWS]
+            block = np.asarray(raw[rows])
+            vectors[s:s + len(rows)], block_scales = quantize(block, self.dtype)
+            if block_scales is not None:
+                scales[s:s + len(rows)] = block_scales
+            sqnorms[s:s + len(rows)] = (block * block).sum(axis=1)
+        vectors.flush()
+        del vectors, raw
+
+        # Sidecar rows follow the (possibly IVF-sorted) vector order
+        src_offsets = np.asarray(self.offsets, dtype=np.int64)
+        new_offsets = np.zeros(n + 1, dtype=np.int64)
+        with open(os.path.join(tmp, "records.raw"), "rb") as src, \
+                open(os.path.join(tmp, "records.jsonl"), "wb") as dst:
+            data = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) if n else b""
+            for j, i in enumerate(order):
+                line = data[src_offsets[i]:src_offsets[i + 1]]
+                dst.write(line)
+                new_offsets[j + 1] = new_offsets[j] + len(line)
+            if n:
+                data.close()
+
+        ids = np.asarray(self.ids, dtype="S")[order] if n else np.zeros(0, dtype="S40")
+        np.save(os.path.join(tmp, "ids.npy"), ids)
+        id_order = np.argsort(ids, kind="stable")
+        np.save(os.path.join(tmp, "ids_sorted.npy"), ids[id_order])
+        np.save(os.path.join(tmp, "ids_order.npy"), id_order)
+        np.save(os.path.join(tmp, "name_codes.npy"), np.asarray(self.name_codes, dtype=np.int32)[order])
+        np.save(os.path.join(tmp, "scales.npy"), scales)
+        np.save(os.path.join(tmp, "sqnorms.npy"), sqnorms)
+        np.save(os.path.join(tmp, "record_offsets.npy"), new_offsets)
+        os.remove(os.path.join(tmp, "vectors.f32"))
+        os.remove(os.path.join(tmp, "records.raw"))
+
+        meta = {
+            "dtype": self.dtype,
+            "dim": self.dim or 0,
+            "count": n,
+            "names": sorted(self.names, key=self.names.get),
+            "nlist": ivf or 0,
+        }
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        # Swap directories; processes still mapping the old files keep working
+        old = self.path + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.replace(self.path, old)
+        os.replace(tmp, self.path)
+        shutil.rmtree(old, ignore_errors=True)
+        return meta
+
+
+def export_collection(collection, path=LOCAL_STORE_DIR, dtype="int8", nlist=0, page_size=5000):
+    """Copy a Chroma collection into a local store; returns its meta dict."""
+    writer = LocalStoreWriter(path, dtype=dtype, nlist=nlist)
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"],
+                              limit=page_size, offset=offset)
+        if not len(page["ids"]):
+            break
+        writer.add(page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+        offset += len(page["ids"])
+    return writer.finalize()
+
+
+class LocalCollection:
+    """Read-only, Chroma-compatible view of a store written by ``LocalStoreWriter``."""
+
+    def __init__(self, path=LOCAL_STORE_DIR, nprobe=8):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.path = path
+        self.nprobe = nprobe
+        self.names = {name: i for i, name in enumerate(self.meta["names"])}
+
+        def load(name):
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        self.vectors = load("vectors.npy")
+        self.scales = load("scales.npy")
+        self.sqnorms = load("sqnorms.npy")
+        self.ids = load("ids.npy")
+        self.name_codes = load("name_codes.npy")
+        self.record_offsets = load("record_offsets.npy")
+        self.centroids = load("ivf_centroids.npy") if self.meta["nlist"] else None
+        self.ivf_offsets = load("ivf_offsets.npy") if self.meta["nlist"] else None
+        self._records_file = open(os.path.join(path, "records.jsonl"), "rb")
+        self._records = (mmap.mmap(self._records_file.fileno(), 0, access=mmap.ACCESS_READ)
+                         if self.meta["count"] else b"")
+        if os.path.exists(os.path.join(path, "ids_sorted.npy")):
+            self._sorted_ids, self._id_order = load("ids_sorted.npy"), load("ids_order.npy")
+        else:
+            self._sorted_ids = self._id_order = None  # older export: sorted on first get()
+
+    @classmethod
+    def load(cls, path=LOCAL_STORE_DIR, nprobe=8):
+        """Open the store, or return None if the build hasn't exported one."""
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        return cls(path, nprobe)
+
+    def count(self):
+        return self.meta["count"]
+
+    # ---------- Rows ----------
+
+    def _dequantize(self, rows):
+        block = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.meta["dtype"] == "int8":
+            block *= np.asarray(self.scales[rows])[:, None]
+        return block
+
+    def _record(self, row):
+        line = self._records[self.record_offsets[row]:self.record_offsets[row + 1]]
+        return json.loads(line)
+
+    def _rows_payload(self, rows, include):
+        out = {"ids": [self.ids[r].decode("ascii") for r in rows]}
+        if "documents" in include or "metadatas" in include:
+            records = [self._record(r) for r in rows]
+            if "documents" in include:
+                out["documents"] = [rec["document"] for rec in records]
+            if "metadatas" in include:
+                out["metadatas"] = [rec["metadata"] for rec in records]
+        if "embeddings" in include:
+            out["embeddings"] = self._dequantize(np.asarray(rows, dtype=np.int64)) if len(rows) else []
+        return out
+
+    def get(self, ids=None, include=("documents", "metadatas"), limit=None, offset=0, where=None):
+        if ids is not None:
+            rows = self._rows_for_ids(ids)
+        else:
+            mask = self._mask(where)
+            rows = np.flatnonzero(mask) if mask is not None else np.arange(self.count())
+            rows = rows[offset:offset + limit if limit is not None else None].tolist()
+        return self._rows_payload(rows, include)
+
+    def _rows_for_ids(self, ids):
+        """Rows of the given IDs (unknown ones skipped), by binary search over the sorted IDs."""
+        if self._sorted_ids is None:
+            self._id_order = np.argsort(self.ids, kind="stable")
+            self._sorted_ids = self.ids[self._id_order]
+        if not len(ids) or not len(self._sorted_ids):
+            return []
+        keys = np.asarray([i.encode("ascii") for i in ids], dtype=self._sorted_ids.dtype)
+        pos = np.minimum(np.searchsorted(self._sorted_ids, keys), len(self._sorted_ids) - 1)
+        found = np.asarray(self._sorted_ids[pos]) == keys
+        return np.asarray(self._id_order[pos[found]]).tolist()
+
+    # ---------- Search ----------
+
+    def _mask(self, where):
+        """Row mask for the ``{"name": ...}`` filters RetrieverAgent produces."""
+        if not where:
+            return None
+        if set(where) != {"name"}:
+            raise ValueError(f"Unsupported filter for the local vector store: {where}")
+        cond = where["name"]
+        wanted = cond["$in"] if isinstance(cond, dict) else [cond]
+        codes = [self.names[n] for n in wanted if n in self.names]
+        return np.isin(self.name_codes, codes)
+
+    def _topk(self, q, rows_iter, k):
+        """Best ``k`` rows by squared L2 distance over ``(row_index_array, mask)`` blocks."""
+        best_rows = np.empty((len(q), 0), dtype=np.int64)
+        best_dist = np.empty((len(q), 0), dtype=np.float32)
+        qn = (q * q).sum(axis=1, keepdims=True)
+        for rows in rows_iter:
+            if not len(rows):
+                continue
+            block = self._dequantize(rows)
+            dist = qn + np.asarray(self.sqnorms[rows])[None, :] - 2.0 * (q @ block.T)
+            dist = np.concatenate([best_dist, dist], axis=1)
+            cand = np.concatenate([np.broadcast_to(best_rows, (len(q), best_rows.shape[1])),
+                                   np.broadcast_to(rows, (len(q), len(rows)))], axis=1)
+            if dist.shape[1] > k:
+                keep = np.argpartition(dist, k - 1, axis=1)[:, :k]
+                dist = np.take_along_axis(dist, keep, axis=1)
+                cand = np.take_along_axis(cand, keep, axis=1)
+            best_dist, best_rows = dist, cand
+        order = np.argsort(best_dist, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_dist, order, axis=1)
+
+    def _flat_blocks(self, mask):
+        for s in range(0, self.count(), BLOCK_ROWS):
+            rows = np.arange(s, min(s + BLOCK_ROWS, self.count()))
+            yield rows[mask[rows]] if mask is not None else rows
+
+    def _ivf_blocks(self, q, mask):
+        lists = np.argsort(-(q @ np.asarray(self.centroids).T))[:self.nprobe]
+        for c in lists:
+            start, end = self.ivf_offsets[c], self.ivf_offsets[c + 1]
+            for s in range(start, end, BLOCK_ROWS):
+                rows = np.arange(s, min(s + BLOCK_ROWS, end))
+                yield rows[mask[rows]] if mask is not None else rows
+
+    def query(self, query_embeddings, n_results=10, where=None, include=DEFAULT_INCLUDE):
+        q = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        mask = self._mask(where)
+        k = n_results
+        if self.centroids is None:
+            # One pass over the store for the whole batch of queries
+            rows, dists = self._topk(q, self._flat_blocks(mask), k)
+            per_query = list(zip(rows, dists))
+        else:
+            per_query = [
+                tuple(a[0] for a in self._topk(q[j:j + 1], self._ivf_blocks(q[j], mask), k))
+                for j in range(len(q))
+            ]
+
+        res = {"ids": [], "distances": []}
+        for field in include:
+            res.setdefault(field, [])
+        for rows, dists in per_query:
+            payload = self._rows_payload(rows.tolist(), include)
+            res["ids"].append(payload["ids"])
+            if "distances" in include:
+                res["distances"].append(dists.tolist())
+            for field in ("documents", "metadatas", "embeddings"):
+                if field in include:
+                    res[field].append(payload[field])
+        return res